@@ -3,26 +3,41 @@
 - Chaque joueur enregistre SON canal personnel avec /mychannel
 - Le bot surveille les deux canaux séparément pendant un duel
 - Toutes les annonces (duel, victoire, classement) se font dans le GROUPE MÈRE
-- Nécessite: pip install python-telegram-bot pytz
+- Nécessite: pip install python-telegram-bot tzdata (orjson, uvloop, aiolimiter recommandés)
 """
 
 import asyncio
+import functools
+import heapq
 import json
 import logging
 import os
 import re
 import time
 import threading
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
-from http.server import HTTPServer, BaseHTTPRequestHandler
 
-import pytz
+from zoneinfo import ZoneInfo
+try:
+    import orjson   # optionnel : (dé)sérialisation JSON bien plus rapide
+except ImportError:
+    orjson = None
+try:
+    import uvloop   # optionnel : boucle asyncio basée sur libuv, E/S réseau plus rapides
+except ImportError:
+    uvloop = None
+try:
+    import aiolimiter   # optionnel : requis par AIORateLimiter (python-telegram-bot[rate-limiter])
+except ImportError:
+    aiolimiter = None
 from telegram import Update, ChatMember, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
-    ContextTypes, filters
+    ContextTypes, Defaults, AIORateLimiter, filters
 )
+from telegram.constants import ParseMode
+from telegram.request import HTTPXRequest
 
 # ─────────────────────────────────────────────
 #  CONFIG
@@ -37,10 +52,22 @@ except ValueError:
     MAIN_GROUP_ID = 0
 
 DATA_FILE      = "duel_data.json"
+HISTORY_FILE   = "duel_history.ndjson"
+HISTORY_MAX    = 500
 DUEL_TIMEOUT   = 300
 ACCEPT_TIMEOUT = 300
 VIDEO_MIN_SIZE = 70 * 1024 * 1024
 
+# Updates traités en parallèle et connexions HTTP disponibles pour les appels API simultanés
+CONCURRENT_UPDATES = 32
+API_POOL_SIZE      = 32
+# Nouvelles tentatives après un 429 (flood control) quand le limiteur d'envoi est actif
+SEND_MAX_RETRIES   = 3
+
+# Ensembles figés pour les tests d'appartenance répétés dans les handlers
+ADMIN_STATUSES = frozenset({ChatMember.ADMINISTRATOR, ChatMember.OWNER})
+CHANNEL_TYPES  = frozenset({"channel", "supergroup"})
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO
@@ -55,15 +82,29 @@ logger.info(f"MAIN_GROUP_ID raw: '{_gid_raw}' → parsed: {MAIN_GROUP_ID}")
 logger.info("=" * 50)
 
 
+_ESC_SPECIAL = r'_*[]()~`>#+-=|{}.!'
+_ESC_TABLE   = str.maketrans({c: '\\' + c for c in _ESC_SPECIAL})
+
+
 def esc(text: str) -> str:
     """Échappe les caractères spéciaux pour MarkdownV2."""
-    special = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(special)}])', r'\\\1', str(text))
+    # Entiers positifs et mots ASCII alphanumériques : rien à échapper
+    if type(text) is int and text >= 0:
+        return str(text)
+    text = str(text)
+    if text.isascii() and text.isalnum():
+        return text
+    return text.translate(_ESC_TABLE)
 
 
 def h(text: str) -> str:
     """Échappe pour HTML Telegram."""
-    return str(text).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    text = str(text)
+    # Cas courant (pseudos, noms de canaux) : rien à échapper, aucune copie
+    if "&" not in text and "<" not in text and ">" not in text:
+        return text
+    # replace() enchaînés plutôt que translate() : bien plus rapides en CPython pour ces 3 caractères
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
 # ─────────────────────────────────────────────
@@ -90,9 +131,29 @@ COMMON_TIMEZONES = {
 TZ_STR_TO_LABEL = {v: k for k, v in COMMON_TIMEZONES.items()}
 
 
+@functools.lru_cache(maxsize=64)
+def _tz(tz_string: str):
+    """ZoneInfo mémoïsé : un seul objet tzinfo par fuseau."""
+    return ZoneInfo(tz_string)
+
+
+# Le décalage ne change qu'aux passages heure d'été/hiver : les caches de
+# décalage sont indexés par tranche de 30 min (certains fuseaux changent à la demi-heure)
+OFFSET_BUCKET = 1800
+
+
+def _offset_bucket() -> int:
+    return int(time.time()) // OFFSET_BUCKET
+
+
 def get_offset_str(tz_string: str) -> str:
+    return _offset_for(tz_string, _offset_bucket())
+
+
+@functools.lru_cache(maxsize=64)
+def _offset_for(tz_string: str, bucket: int) -> str:
     try:
-        tz  = pytz.timezone(tz_string)
+        tz  = _tz(tz_string)
         now = datetime.now(tz)
         total_seconds = int(now.utcoffset().total_seconds())
         sign = "+" if total_seconds >= 0 else "-"
@@ -103,25 +164,57 @@ def get_offset_str(tz_string: str) -> str:
         return "UTC?"
 
 
+def tz_display(tz_string: str) -> tuple[str, str]:
+    """(libellé, offset) du fuseau, déjà échappés pour MarkdownV2."""
+    return _tz_display_for(tz_string, _offset_bucket())
+
+
+@functools.lru_cache(maxsize=128)
+def _tz_display_for(tz_string: str, bucket: int) -> tuple[str, str]:
+    label = TZ_STR_TO_LABEL.get(tz_string, tz_string)
+    return esc(label), esc(get_offset_str(tz_string))
+
+
+def _hhmm(m, now):
+    return now.replace(hour=int(m[0]), minute=int(m[1]), second=0, microsecond=0)
+
+
+def _ddmm_hhmm(m, now):
+    return now.replace(day=int(m[0]), month=int(m[1]), hour=int(m[2]), minute=int(m[3]), second=0, microsecond=0)
+
+
+def _hhmm_ddmm(m, now):
+    return now.replace(hour=int(m[0]), minute=int(m[1]), day=int(m[2]), month=int(m[3]), second=0, microsecond=0)
+
+
+def _ddmmyyyy_hhmm(m, now):
+    return datetime(int(m[2]), int(m[1]), int(m[0]), int(m[3]), int(m[4]))
+
+
+TIME_INPUT_MAX_LEN = 16
+
+# (regex, constructeur, passage au lendemain si l'heure est déjà passée)
+_TIME_PATTERNS = [
+    (re.compile(r"^(\d{1,2}):(\d{2})$"),                                _hhmm,          True),
+    (re.compile(r"^(\d{1,2})/(\d{1,2})\s+(\d{1,2}):(\d{2})$"),           _ddmm_hhmm,     False),
+    (re.compile(r"^(\d{1,2}):(\d{2})\s+(\d{1,2})/(\d{1,2})$"),           _hhmm_ddmm,     False),
+    (re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})\s+(\d{1,2}):(\d{2})$"),   _ddmmyyyy_hhmm, False),
+]
+
+
 def parse_time_input(text: str) -> Optional[datetime]:
     text = text.strip()
-    now  = datetime.now()
-    patterns = [
-        (r"^(\d{1,2}):(\d{2})$",
-         lambda m: now.replace(hour=int(m[0]), minute=int(m[1]), second=0, microsecond=0)),
-        (r"^(\d{1,2})/(\d{1,2})\s+(\d{1,2}):(\d{2})$",
-         lambda m: now.replace(day=int(m[0]), month=int(m[1]), hour=int(m[2]), minute=int(m[3]), second=0, microsecond=0)),
-        (r"^(\d{1,2}):(\d{2})\s+(\d{1,2})/(\d{1,2})$",
-         lambda m: now.replace(hour=int(m[0]), minute=int(m[1]), day=int(m[2]), month=int(m[3]), second=0, microsecond=0)),
-        (r"^(\d{1,2})/(\d{1,2})/(\d{4})\s+(\d{1,2}):(\d{2})$",
-         lambda m: datetime(int(m[2]), int(m[1]), int(m[0]), int(m[3]), int(m[4]))),
-    ]
-    for pattern, builder in patterns:
-        match = re.match(pattern, text)
+    # Tous les formats commencent par un chiffre et le plus long ("JJ/MM/AAAA HH:MM",
+    # arguments joints par un seul espace) fait 16 caractères : inutile de tester les regex sinon
+    if not text or len(text) > TIME_INPUT_MAX_LEN or not text[0].isdigit():
+        return None
+    now = datetime.now()
+    for pattern, builder, rolls_over in _TIME_PATTERNS:
+        match = pattern.match(text)
         if match:
             try:
-                result = builder(match.groups())
-                if result < now and len(match.groups()) <= 2:
+                result = builder(match.groups(), now)
+                if rolls_over and result < now:
                     result += timedelta(days=1)
                 return result
             except ValueError:
@@ -133,10 +226,25 @@ def parse_time_input(text: str) -> Optional[datetime]:
 #  PERSISTANCE
 # ─────────────────────────────────────────────
 
-def load_data() -> dict:
+# L'état complet vit en mémoire : lu une seule fois au démarrage, puis réécrit
+# sur disque par _flush_loop() au plus une fois par SAVE_DEBOUNCE secondes.
+SAVE_DEBOUNCE = 1.0
+
+
+def _loads(raw: bytes) -> dict:
+    return orjson.loads(raw) if orjson else json.loads(raw)
+
+
+def _dumps(data: dict) -> bytes:
+    if orjson:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _read_data_file() -> dict:
     if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+        with open(DATA_FILE, "rb") as f:
+            return _loads(f.read())
     return {
         "players": {},
         "duels": {},
@@ -145,19 +253,193 @@ def load_data() -> dict:
     }
 
 
+# Les écritures peuvent partir d'un thread (_flush_loop) ou du thread principal (arrêt) :
+# le verrou les sérialise et le numéro de version empêche un instantané plus ancien
+# d'écraser un plus récent.
+_WRITE_LOCK      = threading.Lock()
+_WRITE_VERSION   = 0
+_WRITTEN_VERSION = 0
+_WRITTEN_PAYLOAD = b""   # contenu actuel du fichier : un save_data sans vrai changement n'écrit rien
+
+
+def _write_bytes(payload: bytes, version: int):
+    """Écriture atomique et durable : fichier temporaire synchronisé (fsync) puis os.replace."""
+    global _WRITTEN_VERSION, _WRITTEN_PAYLOAD
+    with _WRITE_LOCK:
+        if version <= _WRITTEN_VERSION:
+            return
+        if payload == _WRITTEN_PAYLOAD:
+            _WRITTEN_VERSION = version
+            return
+        tmp = DATA_FILE + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            # Sans fsync, une coupure juste après os.replace peut laisser un fichier vide
+            os.fsync(f.fileno())
+        os.replace(tmp, DATA_FILE)
+        _WRITTEN_VERSION = version
+        _WRITTEN_PAYLOAD = payload
+
+
+def _snapshot(data: dict) -> tuple[bytes, int]:
+    """Sérialise l'état dans le thread de la boucle, avant toute nouvelle mutation."""
+    global _WRITE_VERSION
+    _WRITE_VERSION += 1
+    return _dumps(data), _WRITE_VERSION
+
+
+def _write_data_file(data: dict):
+    _write_bytes(*_snapshot(data))
+
+
+def _trim_history(data: dict):
+    """Garde les HISTORY_MAX derniers duels en mémoire ; les plus anciens partent dans HISTORY_FILE.
+
+    data["history_archive_size"] retient la taille de l'archive qui correspond à l'état
+    sauvegardé : voir _reconcile_history_archive() au démarrage.
+    """
+    history = data.get("history", [])
+    overflow = len(history) - HISTORY_MAX
+    if overflow <= 0:
+        return
+    try:
+        with open(HISTORY_FILE, "ab") as f:
+            f.write(b"".join(_dumps(entry) + b"\n" for entry in history[:overflow]))
+            size = f.tell()
+    except OSError as e:
+        logger.error(f"Erreur archivage {HISTORY_FILE}: {e}")
+        return
+    data["history"] = history[overflow:]
+    data["history_archive_size"] = size
+    save_data(data)
+
+
+def _reconcile_history_archive(data: dict):
+    """Annule un archivage que la dernière sauvegarde n'a pas suivi (arrêt brutal entre les deux).
+
+    Les entrées au-delà de history_archive_size sont encore dans data["history"] :
+    on les retire de l'archive pour que _trim_history ne les écrive pas deux fois.
+    """
+    try:
+        size = os.path.getsize(HISTORY_FILE)
+    except OSError:
+        size = 0
+    saved = data.get("history_archive_size")
+    if saved is not None and saved < size:
+        try:
+            os.truncate(HISTORY_FILE, saved)
+            return
+        except OSError as e:
+            logger.error(f"Erreur réparation {HISTORY_FILE}: {e}")
+    if saved != size:
+        # Ancien fichier de données sans curseur, ou archive déplacée à la main : le curseur
+        # doit être sur disque avant tout nouvel archivage, d'où l'écriture immédiate.
+        # Premier lancement (aucun fichier) : il partira avec la première sauvegarde.
+        data["history_archive_size"] = size
+        if os.path.exists(DATA_FILE):
+            _write_data_file(data)
+
+
+def add_history(data: dict, entry: dict):
+    data["history"].append(entry)
+    _trim_history(data)
+
+
+_DATA  = _read_data_file()
+_DIRTY = asyncio.Event()
+
+
+def load_data() -> dict:
+    """Retourne l'état en mémoire (aucune lecture disque)."""
+    return _DATA
+
+
 def save_data(data: dict):
-    with open(DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Marque l'état comme modifié ; l'écriture est différée à _flush_loop()."""
+    _DIRTY.set()
+
+
+_reconcile_history_archive(_DATA)
+_trim_history(_DATA)
+
+
+async def _flush_loop():
+    """Tâche de fond : regroupe les sauvegardes rapprochées en une seule écriture."""
+    while True:
+        await _DIRTY.wait()
+        await asyncio.sleep(SAVE_DEBOUNCE)
+        _DIRTY.clear()
+        try:
+            # Sérialisation ici, écriture disque dans un thread : la boucle ne bloque pas sur l'I/O
+            await asyncio.to_thread(_write_bytes, *_snapshot(_DATA))
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde {DATA_FILE}: {e}")
+            _DIRTY.set()
+
+
+def flush_data():
+    """Écriture immédiate si des modifications sont en attente (arrêt du bot)."""
+    if _DIRTY.is_set():
+        _DIRTY.clear()
+        _write_data_file(_DATA)
 
 
 # ─────────────────────────────────────────────
 #  HELPERS JOUEURS
 # ─────────────────────────────────────────────
 
+# Index pseudo (en minuscules) → uid, tenu à jour par get_player ; en cas d'homonymes, le premier joueur garde le pseudo
+_USERNAME_INDEX: dict[str, str] = {}
+
+
+# Index défié (user_id) → clés des duels "pending" qui l'attendent, par ordre de création
+_PENDING_BY_CHALLENGED: dict[int, list[str]] = {}
+
+# Index joueur (user_id) → clés de tous ses duels (quel que soit le statut), par ordre de création
+_DUELS_BY_USER: dict[int, list[str]] = {}
+
+# Canal → clé du duel actif qui le surveille, et canaux d'un rank actif :
+# handle_video ignore tous les autres sans parcourir data["duels"]
+_ACTIVE_BY_CHAT: dict[int, str] = {}
+_RANK_CHATS: set[int] = set()
+
+
+def _build_indexes(data: dict):
+    """Reconstruit les index en mémoire à partir de l'état chargé."""
+    _USERNAME_INDEX.clear()
+    for uid, p in data["players"].items():
+        if p.get("username"):
+            _USERNAME_INDEX.setdefault(p["username"].lower(), uid)
+    _PENDING_BY_CHALLENGED.clear()
+    _DUELS_BY_USER.clear()
+    for key, duel in data.get("duels", {}).items():
+        _index_participants(key, duel)
+        if duel["status"] == "pending":
+            _index_pending(key, duel)
+    refresh_watched_chats(data)
+
+
+def refresh_watched_chats(data: dict):
+    """Recalcule _ACTIVE_BY_CHAT et _RANK_CHATS ; appelé à chaque début/fin de duel ou de rank."""
+    _ACTIVE_BY_CHAT.clear()
+    for key, duel in data.get("duels", {}).items():
+        if duel["status"] == "active":
+            for chat in (duel.get("challenger_channel"), duel.get("challenged_channel")):
+                if chat is not None:
+                    _ACTIVE_BY_CHAT.setdefault(chat, key)
+    _RANK_CHATS.clear()
+    for r in data.get("ranks", {}).values():
+        if r["status"] == "active":
+            _RANK_CHATS.update(p["channel_id"] for p in r["players"])
+    _RANK_CHATS.discard(None)
+
+
 def get_player(data: dict, user_id: int, username: str = None) -> dict:
     uid = str(user_id)
-    if uid not in data["players"]:
-        data["players"][uid] = {
+    p   = data["players"].get(uid)
+    if p is None:
+        p = data["players"][uid] = {
             "username": username or str(user_id),
             "points": 0, "wins": 0, "losses": 0,
             "duels_played": 0, "timezone": None,
@@ -165,28 +447,147 @@ def get_player(data: dict, user_id: int, username: str = None) -> dict:
             "channel_name": None,
             "joined": datetime.now().isoformat()
         }
+        _USERNAME_INDEX.setdefault(p["username"].lower(), uid)
     elif username:
-        data["players"][uid]["username"] = username
-    return data["players"][uid]
+        old = p.get("username", "")
+        if old != username:
+            p["username"] = username
+            _USERNAME_INDEX.setdefault(username.lower(), uid)
+            if old.lower() != username.lower() and _USERNAME_INDEX.get(old.lower()) == uid:
+                _reindex_username(data, old.lower())
+    return p
+
+
+def _reindex_username(data: dict, name: str):
+    """Réattribue un pseudo libéré au premier autre joueur qui le porte encore (même règle qu'au chargement)."""
+    _USERNAME_INDEX.pop(name, None)
+    for uid, p in data["players"].items():
+        if (p.get("username") or "").lower() == name:
+            _USERNAME_INDEX[name] = uid
+            return
+
+
+def display_name(user) -> str:
+    """Nom affiché d'un utilisateur Telegram : @pseudo, sinon prénom."""
+    return user.username or user.first_name
+
+
+@functools.lru_cache(maxsize=1024)
+def _esc_name(name: str) -> str:
+    return esc(name)
+
+
+def esc_display_name(user) -> str:
+    """display_name() déjà échappé pour MarkdownV2, mémoïsé par nom."""
+    return _esc_name(display_name(user))
 
 
 def get_player_by_username(data: dict, username: str):
     """Retourne (uid_str, player_dict) ou (None, None)."""
-    uname = username.lower().lstrip("@")
-    for uid, p in data["players"].items():
-        if p.get("username", "").lower() == uname:
-            return uid, p
-    return None, None
+    uid = _USERNAME_INDEX.get(username.lower().lstrip("@"))
+    p   = data["players"].get(uid) if uid else None
+    if p is None:
+        return None, None
+    return uid, p
+
+
+# Statuts admin du groupe principal : user_id → (est_admin, expiration)
+ADMIN_CACHE_TTL = 60
+_ADMIN_CACHE: dict[int, tuple[bool, float]] = {}
+
+
+async def is_group_admin(bot, user_id: int) -> bool:
+    """Admin/créateur de MAIN_GROUP_ID ? Mis en cache ADMIN_CACHE_TTL s ; lève l'erreur API sinon."""
+    now    = time.time()
+    cached = _ADMIN_CACHE.get(user_id)
+    if cached and cached[1] > now:
+        return cached[0]
+    member = await bot.get_chat_member(MAIN_GROUP_ID, user_id)
+    result = member.status in ADMIN_STATUSES
+    _ADMIN_CACHE[user_id] = (result, now + ADMIN_CACHE_TTL)
+    return result
+
+
+# ─────────────────────────────────────────────
+#  HELPERS DUELS
+# ─────────────────────────────────────────────
+
+def _index_pending(duel_key: str, duel: dict):
+    _PENDING_BY_CHALLENGED.setdefault(duel["challenged_id"], []).append(duel_key)
+
+
+def _unindex_pending(duel_key: str, duel: dict):
+    keys = _PENDING_BY_CHALLENGED.get(duel["challenged_id"])
+    if keys and duel_key in keys:
+        keys.remove(duel_key)
+        if not keys:
+            del _PENDING_BY_CHALLENGED[duel["challenged_id"]]
+
+
+def _index_participants(duel_key: str, duel: dict):
+    for uid in (duel["challenger_id"], duel["challenged_id"]):
+        _DUELS_BY_USER.setdefault(uid, []).append(duel_key)
+
+
+def _unindex_participants(duel_key: str, duel: dict):
+    for uid in (duel["challenger_id"], duel["challenged_id"]):
+        keys = _DUELS_BY_USER.get(uid)
+        if keys and duel_key in keys:
+            keys.remove(duel_key)
+            if not keys:
+                del _DUELS_BY_USER[uid]
+
+
+def get_user_duel(data: dict, user_id: int):
+    """Retourne (duel_key, duel) du plus ancien duel du joueur (tout statut), ou (None, None)."""
+    keys = _DUELS_BY_USER.get(user_id)
+    if not keys:
+        return None, None
+    return keys[0], data["duels"][keys[0]]
+
+
+def get_pending_duel(data: dict, user_id: int):
+    """Retourne (duel_key, duel) du plus ancien défi en attente pour ce joueur, ou (None, None)."""
+    keys = _PENDING_BY_CHALLENGED.get(user_id)
+    if not keys:
+        return None, None
+    return keys[0], data["duels"][keys[0]]
+
+
+def _remove_duel(data: dict, duel_key: str) -> Optional[dict]:
+    """Supprime un duel de l'état et de tous les index."""
+    duel = data["duels"].pop(duel_key, None)
+    if duel is not None:
+        _unindex_participants(duel_key, duel)
+    if duel is not None and duel["status"] == "pending":
+        _unindex_pending(duel_key, duel)
+    elif duel is not None and duel["status"] == "active":
+        refresh_watched_chats(data)
+    return duel
+
+
+_build_indexes(_DATA)
+
+
+# Dernier classement rendu, réutilisé tant que le top 10 n'a pas bougé
+_LEADERBOARD_CACHE: tuple = ((), "")
 
 
 def format_leaderboard(data: dict) -> str:
-    players = [(uid, p) for uid, p in data["players"].items() if p.get("duels_played", 0) > 0]
-    if not players:
+    global _LEADERBOARD_CACHE
+    players = ((uid, p) for uid, p in data["players"].items() if p.get("duels_played", 0) > 0)
+    top     = heapq.nlargest(10, players, key=lambda x: x[1]["points"])
+    if not top:
         return "📊 Aucun joueur au classement pour l'instant\\."
-    players.sort(key=lambda x: x[1]["points"], reverse=True)
+    signature = tuple(
+        (uid, p["points"], p.get("wins", 0), p.get("losses", 0), p.get("username"), bool(p.get("channel_name")))
+        for uid, p in top
+    )
+    if _LEADERBOARD_CACHE[0] == signature:
+        return _LEADERBOARD_CACHE[1]
     medals = ["🥇", "🥈", "🥉"]
     lines  = ["🏆 *CLASSEMENT DES DUELS*\n"]
-    for i, (uid, p) in enumerate(players[:10]):
+    for i, (uid, p) in enumerate(top):
         medal = medals[i] if i < 3 else f"{i+1}\\."
         name  = esc(p.get("username", uid))
         pts   = esc(p["points"])
@@ -194,48 +595,54 @@ def format_leaderboard(data: dict) -> str:
         l     = p.get("losses", 0)
         ch    = f" 📺" if p.get("channel_name") else ""
         lines.append(f"{medal} @{name}{ch} — *{pts} pts* \\({w}W/{l}L\\)")
-    return "\n".join(lines)
+    text = "\n".join(lines)
+    _LEADERBOARD_CACHE = (signature, text)
+    return text
 
 
 # ─────────────────────────────────────────────
 #  /start & /help
 # ─────────────────────────────────────────────
 
+_START_MSG = (
+    "👋 *Bienvenue sur DuelBot V4 \\!*\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "📋 *INSCRIPTION*\n"
+    "`/join` — S'inscrire au classement\n"
+    "`/mychannel` — Enregistrer ton canal de duel\n"
+    "`/settimezone` — Définir ton fuseau horaire\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "⚔️ *DUELS*\n"
+    "`/duel @pseudo` — Duel immédiat\n"
+    "`/duel @pseudo 18:30` — Duel planifié \\(ton heure\\)\n"
+    "`/duel @pseudo 18:30 25/07` — Date précise\n"
+    "`/accept` — Accepter un duel\n"
+    "`/decline` — Refuser un duel\n"
+    "`/cancel` — Annuler son duel en cours\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "🏆 *MODE RANK*\n"
+    "`/rank` — Créer ou rejoindre une session rank \\(jusqu'à 16 joueurs\\)\n"
+    "`/startrank` — Démarrer la session rank\n"
+    "`/rankstatus` — Voir le classement en temps réel\n"
+    "`/cancelrank` — Annuler la session rank\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "📊 *STATS*\n"
+    "`/top` — Classement général\n"
+    "`/stats` — Ses statistiques\n"
+    "`/mystats` — Ses stats détaillées\n"
+    "`/regles` — Règles du jeu\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "🔧 *ADMIN*\n"
+    "`/addchannel` — Ajouter un canal au bot\n"
+    "`/channels` — Voir les canaux enregistrés\n"
+    "`/resetpoints @pseudo` — Remettre à zéro\n"
+    "`/chatid` — Afficher l'ID de ce chat\n"
+    "`/debug` — État du bot \\(duels, canaux surveillés\\)\n"
+)
+
+
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = (
-        "👋 *Bienvenue sur DuelBot V4 \\!*\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "📋 *INSCRIPTION*\n"
-        "`/join` — S'inscrire au classement\n"
-        "`/mychannel` — Enregistrer ton canal de duel\n"
-        "`/settimezone` — Définir ton fuseau horaire\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "⚔️ *DUELS*\n"
-        "`/duel @pseudo` — Duel immédiat\n"
-        "`/duel @pseudo 18:30` — Duel planifié \\(ton heure\\)\n"
-        "`/duel @pseudo 18:30 25/07` — Date précise\n"
-        "`/accept` — Accepter un duel\n"
-        "`/decline` — Refuser un duel\n"
-        "`/cancel` — Annuler son duel en cours\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "🏆 *MODE RANK*\n"
-        "`/rank` — Créer ou rejoindre une session rank \(jusqu'à 16 joueurs\)\n"
-        "`/startrank` — Démarrer la session rank\n"
-        "`/rankstatus` — Voir le classement en temps réel\n"
-        "`/cancelrank` — Annuler la session rank\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "📊 *STATS*\n"
-        "`/top` — Classement général\n"
-        "`/stats` — Ses statistiques\n"
-        "`/mystats` — Ses stats détaillées\n"
-        "`/regles` — Règles du jeu\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "🔧 *ADMIN*\n"
-        "`/addchannel` — Ajouter un canal au bot\n"
-        "`/channels` — Voir les canaux enregistrés\n"
-        "`/resetpoints @pseudo` — Remettre à zéro\n"
-    )
-    await update.message.reply_text(msg, parse_mode="MarkdownV2")
+    await update.message.reply_text(_START_MSG)
 
 
 # ─────────────────────────────────────────────
@@ -246,14 +653,13 @@ async def cmd_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     data = load_data()
     uid  = str(user.id)
-    name = user.username or user.first_name
+    name = display_name(user)
 
-    if uid in data["players"]:
-        p = data["players"][uid]
+    p = data["players"].get(uid)
+    if p is not None:
         ch_info = f"\n📺 Canal enregistré : *{esc(p.get('channel_name', 'Aucun'))}*" if p.get("channel_name") else "\n📺 Pas encore de canal \\— utilise `/mychannel`"
         await update.message.reply_text(
-            f"✅ @{esc(name)}, tu es déjà inscrit \\!{ch_info}",
-            parse_mode="MarkdownV2"
+            f"✅ @{esc(name)}, tu es déjà inscrit \\!{ch_info}"
         )
     else:
         get_player(data, user.id, name)
@@ -263,8 +669,7 @@ async def cmd_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"Prochaines étapes :\n"
             f"1️⃣ `/mychannel` — Enregistre ton canal de duel\n"
             f"2️⃣ `/settimezone` — Définis ton fuseau horaire\n"
-            f"3️⃣ `/duel @pseudo` — Lance ton premier duel \\!",
-            parse_mode="MarkdownV2"
+            f"3️⃣ `/duel @pseudo` — Lance ton premier duel \\!"
         )
 
 
@@ -282,35 +687,34 @@ async def cmd_mychannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = load_data()
 
     # Si utilisé depuis un canal directement
-    if chat.type in ["channel", "supergroup"] and chat.id != MAIN_GROUP_ID:
+    if chat.type in CHANNEL_TYPES and chat.id != MAIN_GROUP_ID:
         # Vérifier que le bot est admin dans ce canal
         try:
             bot_member = await context.bot.get_chat_member(chat.id, context.bot.id)
-            if bot_member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
+            if bot_member.status not in ADMIN_STATUSES:
                 await update.message.reply_text(
-                    "❌ Je dois être admin dans ce canal pour l'enregistrer\\.",
-                    parse_mode="MarkdownV2"
+                    "❌ Je dois être admin dans ce canal pour l'enregistrer\\."
                 )
                 return
         except Exception:
             pass
 
         # Enregistrer
-        p = get_player(data, user.id, user.username or user.first_name)
+        ch_name = chat.title or chat.username or str(chat.id)
+        p = get_player(data, user.id, display_name(user))
         p["channel_id"]   = chat.id
-        p["channel_name"] = chat.title or chat.username or str(chat.id)
+        p["channel_name"] = ch_name
 
         if "registered_channels" not in data:
             data["registered_channels"] = {}
         data["registered_channels"][str(chat.id)] = user.id
+        remember_chat_name(chat.id, ch_name)
 
         save_data(data)
 
-        ch_name = chat.title or chat.username or str(chat.id)
         await update.message.reply_text(
             f"✅ Canal *{esc(ch_name)}* enregistré comme ton canal de duel \\!\n"
-            f"Les duels te concernant seront surveillés ici\\.",
-            parse_mode="MarkdownV2"
+            f"Les duels te concernant seront surveillés ici\\."
         )
         return
 
@@ -318,51 +722,56 @@ async def cmd_mychannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if context.args:
         channel_ref = context.args[0]
         try:
-            # Essayer par ID ou @username
+            # Essayer par ID ou @username (la recherche par @username renvoie déjà le canal complet)
+            ch_obj = None
             if channel_ref.lstrip("-").isdigit():
                 channel_id = int(channel_ref)
             else:
                 channel_ref_clean = channel_ref if channel_ref.startswith("@") else f"@{channel_ref}"
-                chat_obj   = await context.bot.get_chat(channel_ref_clean)
-                channel_id = chat_obj.id
-
-            ch_obj  = await context.bot.get_chat(channel_id)
+                ch_obj     = await context.bot.get_chat(channel_ref_clean)
+                channel_id = ch_obj.id
+
+            # Statut du bot et, si besoin, infos du canal : appels indépendants, lancés en parallèle
+            calls = [context.bot.get_chat_member(channel_id, context.bot.id)]
+            if ch_obj is None:
+                calls.append(context.bot.get_chat(channel_id))
+            bot_member, *fetched = await asyncio.gather(*calls, return_exceptions=True)
+            if fetched:
+                ch_obj = fetched[0]
+            if isinstance(ch_obj, Exception):
+                raise ch_obj
             ch_name = ch_obj.title or ch_obj.username or str(channel_id)
 
             # Vérifier que le bot est admin
-            try:
-                bot_member = await context.bot.get_chat_member(channel_id, context.bot.id)
-                if bot_member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
-                    await update.message.reply_text(
-                        f"❌ Je ne suis pas admin dans *{esc(ch_name)}*\\. Ajoute\\-moi comme admin d'abord \\!",
-                        parse_mode="MarkdownV2"
-                    )
-                    return
-            except Exception:
-                await update.message.reply_text("❌ Impossible d'accéder à ce canal\\. Vérifie que je suis admin dedans\\.", parse_mode="MarkdownV2")
+            if isinstance(bot_member, Exception):
+                await update.message.reply_text("❌ Impossible d'accéder à ce canal\\. Vérifie que je suis admin dedans\\.")
+                return
+            if bot_member.status not in ADMIN_STATUSES:
+                await update.message.reply_text(
+                    f"❌ Je ne suis pas admin dans *{esc(ch_name)}*\\. Ajoute\\-moi comme admin d'abord \\!"
+                )
                 return
 
-            p = get_player(data, user.id, user.username or user.first_name)
+            p = get_player(data, user.id, display_name(user))
             p["channel_id"]   = channel_id
             p["channel_name"] = ch_name
 
             if "registered_channels" not in data:
                 data["registered_channels"] = {}
             data["registered_channels"][str(channel_id)] = user.id
+            remember_chat_name(channel_id, ch_name)
 
             save_data(data)
             await update.message.reply_text(
                 f"✅ *{esc(ch_name)}* enregistré comme ton canal de duel \\!\n"
-                f"Les vidéos postées là\\-dedans compteront pour tes duels\\.",
-                parse_mode="MarkdownV2"
+                f"Les vidéos postées là\\-dedans compteront pour tes duels\\."
             )
 
         except Exception as e:
             await update.message.reply_text(
                 f"❌ Canal introuvable ou inaccessible\\.\n"
                 f"Assure\\-toi que je suis admin dans le canal et réessaie\\.\n\n"
-                f"Usage : `/mychannel @nomdcanal` ou `/mychannel -1001234567890`",
-                parse_mode="MarkdownV2"
+                f"Usage : `/mychannel @nomdcanal` ou `/mychannel -1001234567890`"
             )
         return
 
@@ -376,8 +785,7 @@ async def cmd_mychannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "`/mychannel @nomdcanal`\n"
         "ou\n"
         "`/mychannel -1001234567890` \\(l'ID du canal\\)\n\n"
-        "💡 Le bot doit être *admin* dans ton canal pour détecter les vidéos\\.",
-        parse_mode="MarkdownV2"
+        "💡 Le bot doit être *admin* dans ton canal pour détecter les vidéos\\."
     )
 
 
@@ -391,30 +799,27 @@ async def cmd_addchannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = load_data()
 
     try:
-        member = await context.bot.get_chat_member(MAIN_GROUP_ID, user.id)
-        if member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
-            await update.message.reply_text("❌ Commande réservée aux admins\\.", parse_mode="MarkdownV2")
+        if not await is_group_admin(context.bot, user.id):
+            await update.message.reply_text("❌ Commande réservée aux admins\\.")
             return
     except Exception:
         pass
 
     if not context.args:
         await update.message.reply_text(
-            "Usage : `/addchannel @canal` ou `/addchannel -1001234567890`",
-            parse_mode="MarkdownV2"
+            "Usage : `/addchannel @canal` ou `/addchannel -1001234567890`"
         )
         return
 
     channel_ref = context.args[0]
     try:
+        # Un seul get_chat, par ID ou par @username
         if channel_ref.lstrip("-").isdigit():
-            channel_id = int(channel_ref)
+            ch_obj = await context.bot.get_chat(int(channel_ref))
         else:
             channel_ref_clean = channel_ref if channel_ref.startswith("@") else f"@{channel_ref}"
-            ch_obj     = await context.bot.get_chat(channel_ref_clean)
-            channel_id = ch_obj.id
-
-        ch_obj  = await context.bot.get_chat(channel_id)
+            ch_obj = await context.bot.get_chat(channel_ref_clean)
+        channel_id = ch_obj.id
         ch_name = ch_obj.title or ch_obj.username or str(channel_id)
 
         if "registered_channels" not in data:
@@ -422,40 +827,87 @@ async def cmd_addchannel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if str(channel_id) not in data["registered_channels"]:
             data["registered_channels"][str(channel_id)] = None  # pas de propriétaire défini
+            remember_chat_name(channel_id, ch_name)
             save_data(data)
             await update.message.reply_text(
-                f"✅ Canal *{esc(ch_name)}* ajouté à la surveillance\\.",
-                parse_mode="MarkdownV2"
+                f"✅ Canal *{esc(ch_name)}* ajouté à la surveillance\\."
             )
         else:
-            await update.message.reply_text(f"ℹ️ Ce canal est déjà enregistré\\.", parse_mode="MarkdownV2")
+            await update.message.reply_text(f"ℹ️ Ce canal est déjà enregistré\\.")
 
     except Exception:
-        await update.message.reply_text("❌ Canal introuvable ou inaccessible\\.", parse_mode="MarkdownV2")
+        await update.message.reply_text("❌ Canal introuvable ou inaccessible\\.")
 
 
 # ─────────────────────────────────────────────
 #  /channels — Lister les canaux enregistrés
 # ─────────────────────────────────────────────
 
+# Titres des canaux : chat_id → (nom, expiration) ; évite un get_chat par canal à chaque /channels
+CHAT_NAME_TTL = 600
+_CHAT_NAME_CACHE: dict[int, tuple[str, float]] = {}
+
+
+async def chat_names(bot, chat_ids: list[int]) -> dict[int, str]:
+    """Noms des canaux, depuis le cache ou via des get_chat lancés en parallèle."""
+    now   = time.time()
+    names = {}
+    stale = []
+    for cid in chat_ids:
+        cached = _CHAT_NAME_CACHE.get(cid)
+        if cached and cached[1] > now:
+            names[cid] = cached[0]
+        else:
+            stale.append(cid)
+    results = await asyncio.gather(*(bot.get_chat(cid) for cid in stale), return_exceptions=True)
+    for cid, ch in zip(stale, results):
+        if isinstance(ch, Exception):
+            names[cid] = str(cid)   # pas mis en cache : on réessaiera au prochain appel
+            continue
+        names[cid] = ch.title or ch.username or str(cid)
+        _CHAT_NAME_CACHE[cid] = (names[cid], now + CHAT_NAME_TTL)
+    return names
+
+
+def remember_chat_name(chat_id: int, name: str):
+    """Met en cache le nom d'un canal déjà obtenu (enregistrement) : /channels n'aura pas à le redemander."""
+    _CHAT_NAME_CACHE[chat_id] = (name, time.time() + CHAT_NAME_TTL)
+
+
+# Limite Telegram : 4096 caractères par message, on garde une marge
+MESSAGE_MAX_LEN = 4000
+
+_CHANNELS_HEADER = "📺 *Canaux enregistrés \\({count}\\) :*\n"
+
+
+def paginate(lines: list[str], limit: int = MESSAGE_MAX_LEN) -> list[str]:
+    """Regroupe les lignes en messages de moins de `limit` caractères."""
+    pages, page, size = [], [], 0
+    for line in lines:
+        if page and size + len(line) + 1 > limit:
+            pages.append("\n".join(page))
+            page, size = [], 0
+        page.append(line)
+        size += len(line) + 1
+    if page:
+        pages.append("\n".join(page))
+    return pages
+
+
 async def cmd_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data     = load_data()
     channels = data.get("registered_channels", {})
 
     if not channels:
         await update.message.reply_text(
-            "ℹ️ Aucun canal enregistré\\.\nUtilise `/mychannel` pour enregistrer le tien\\.",
-            parse_mode="MarkdownV2"
+            "ℹ️ Aucun canal enregistré\\.\nUtilise `/mychannel` pour enregistrer le tien\\."
         )
         return
 
-    lines = [f"📺 *Canaux enregistrés \\({len(channels)}\\) :*\n"]
+    names = await chat_names(context.bot, [int(cid) for cid in channels])
+    lines = [_CHANNELS_HEADER.format(count=len(channels))]
     for cid, owner_id in channels.items():
-        try:
-            ch     = await context.bot.get_chat(int(cid))
-            ch_name = esc(ch.title or ch.username or cid)
-        except Exception:
-            ch_name = esc(str(cid))
+        ch_name = esc(names[int(cid)])
 
         if owner_id:
             owner_p = data["players"].get(str(owner_id), {})
@@ -464,27 +916,42 @@ async def cmd_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             lines.append(f"• *{ch_name}* → \\(sans propriétaire\\)")
 
-    await update.message.reply_text("\n".join(lines), parse_mode="MarkdownV2")
+    # Envoi séquentiel : les pages doivent arriver dans l'ordre
+    for page in paginate(lines):
+        await update.message.reply_text(page)
 
 
 # ─────────────────────────────────────────────
 #  /settimezone
 # ─────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=2)
+def _tz_labels(bucket: int) -> tuple[tuple[str, str], ...]:
+    """Libellés "fuseau (offset)", identiques pour tous les joueurs sur une tranche OFFSET_BUCKET."""
+    return tuple(
+        (f"{label} ({get_offset_str(tz_str)})", tz_str)
+        for label, tz_str in COMMON_TIMEZONES.items()
+    )
+
+
+@functools.lru_cache(maxsize=256)
+def _tz_keyboard_for(user_id: int, bucket: int) -> InlineKeyboardMarkup:
+    # InlineKeyboardMarkup est immuable : le même objet peut être renvoyé à chaque /settimezone
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(text, callback_data=f"settz:{user_id}:{tz_str}")]
+        for text, tz_str in _tz_labels(bucket)
+    ])
+
+
 def tz_keyboard(user_id: int) -> InlineKeyboardMarkup:
-    buttons = []
-    for label, tz_str in COMMON_TIMEZONES.items():
-        offset = get_offset_str(tz_str)
-        buttons.append([InlineKeyboardButton(f"{label} ({offset})", callback_data=f"settz:{user_id}:{tz_str}")])
-    return InlineKeyboardMarkup(buttons)
+    return _tz_keyboard_for(user_id, _offset_bucket())
 
 
 async def cmd_settimezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     await update.message.reply_text(
         "🌍 *Choisis ton fuseau horaire :*",
-        reply_markup=tz_keyboard(user.id),
-        parse_mode="MarkdownV2"
+        reply_markup=tz_keyboard(user.id)
     )
 
 
@@ -499,14 +966,16 @@ async def callback_settz(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("❌ Ce menu n'est pas pour toi.", show_alert=True)
         return
     data  = load_data()
-    p     = get_player(data, int(uid_str), query.from_user.username or query.from_user.first_name)
-    p["timezone"] = tz_str
-    save_data(data)
+    name  = display_name(query.from_user)
+    known = data["players"].get(uid_str)
+    # Clic sur le fuseau déjà enregistré, pseudo inchangé : rien à sauvegarder
+    if known is None or known.get("username") != name or known.get("timezone") != tz_str:
+        get_player(data, int(uid_str), name)["timezone"] = tz_str
+        save_data(data)
     label  = TZ_STR_TO_LABEL.get(tz_str, tz_str)
     offset = get_offset_str(tz_str)
     await query.edit_message_text(
-        f"✅ Fuseau enregistré : *{esc(label)}* \\({esc(offset)}\\)",
-        parse_mode="MarkdownV2"
+        f"✅ Fuseau enregistré : *{esc(label)}* \\({esc(offset)}\\)"
     )
 
 
@@ -514,22 +983,41 @@ async def callback_settz(update: Update, context: ContextTypes.DEFAULT_TYPE):
 #  /duel — Lancer un duel
 # ─────────────────────────────────────────────
 
+_DUEL_CHALLENGE_TMPL = (
+    "⚔️ *DÉFI LANCÉ \\!*\n\n"
+    "@{a} 🆚 @{b}\n\n"
+    "📺 Canal de @{a} : *{ch_a}*\n"
+    "📺 Canal de @{b} : *{ch_b}*\n\n"
+    "@{b}, réponds avec `/accept` pour accepter "
+    "ou `/decline` pour refuser\\.\n"
+    "⏱️ 5 minutes pour répondre\\."
+)
+_DUEL_CHALLENGE_SCHEDULED_TMPL = (
+    "⚔️ *DÉFI PLANIFIÉ \\!*\n\n"
+    "@{a} 🆚 @{b}\n\n"
+    "📺 Canal de @{a} : *{ch_a}*\n"
+    "📺 Canal de @{b} : *{ch_b}*"
+    "{info}\n\n"
+    "@{b}, réponds avec `/accept` ou `/decline`\\.\n"
+    "⏱️ 5 minutes pour répondre\\."
+)
+
+
 async def cmd_duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Seulement depuis le groupe mère
     if update.effective_chat.id != MAIN_GROUP_ID:
         await update.message.reply_text(
-            f"❌ Les duels doivent être lancés depuis le groupe principal\\.",
-            parse_mode="MarkdownV2"
+            f"❌ Les duels doivent être lancés depuis le groupe principal\\."
         )
         return
 
     challenger = update.effective_user
     data       = load_data()
+    now        = time.time()
 
     if not context.args:
         await update.message.reply_text(
-            "❌ Usage :\n`/duel @pseudo` — duel immédiat\n`/duel @pseudo 18:30` — planifié",
-            parse_mode="MarkdownV2"
+            "❌ Usage :\n`/duel @pseudo` — duel immédiat\n`/duel @pseudo 18:30` — planifié"
         )
         return
 
@@ -538,37 +1026,34 @@ async def cmd_duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if not target_uid_str:
         await update.message.reply_text(
-            f"❌ @{esc(target_username)} n'est pas inscrit\\. Il/elle doit faire `/join` d'abord \\!",
-            parse_mode="MarkdownV2"
+            f"❌ @{esc(target_username)} n'est pas inscrit\\. Il/elle doit faire `/join` d'abord \\!"
         )
         return
 
     target_uid = int(target_uid_str)
 
     if target_uid == challenger.id:
-        await update.message.reply_text("😂 Tu ne peux pas te défier toi\\-même \\!", parse_mode="MarkdownV2")
+        await update.message.reply_text("😂 Tu ne peux pas te défier toi\\-même \\!")
         return
 
-    # Vérifier que les deux ont un canal enregistré
-    challenger_p = get_player(data, challenger.id, challenger.username or challenger.first_name)
-    if not challenger_p.get("channel_id"):
+    # Vérifier que les deux ont un canal enregistré (sans créer de fiche joueur)
+    if not data["players"].get(str(challenger.id), {}).get("channel_id"):
         await update.message.reply_text(
-            "❌ Tu n'as pas encore enregistré ton canal de duel\\.\nUtilise `/mychannel` d'abord \\!",
-            parse_mode="MarkdownV2"
+            "❌ Tu n'as pas encore enregistré ton canal de duel\\.\nUtilise `/mychannel` d'abord \\!"
         )
         return
+    challenger_p = get_player(data, challenger.id, display_name(challenger))
 
     if not target_p.get("channel_id"):
         await update.message.reply_text(
             f"❌ @{esc(target_username)} n'a pas encore enregistré son canal de duel\\.\n"
-            f"Il/elle doit utiliser `/mychannel` d'abord \\!",
-            parse_mode="MarkdownV2"
+            f"Il/elle doit utiliser `/mychannel` d'abord \\!"
         )
         return
 
     duel_key = f"{min(challenger.id, target_uid)}_{max(challenger.id, target_uid)}"
     if duel_key in data.get("duels", {}):
-        await update.message.reply_text("⚠️ Un duel est déjà en cours entre vous deux \\!", parse_mode="MarkdownV2")
+        await update.message.reply_text("⚠️ Un duel est déjà en cours entre vous deux \\!")
         return
 
     # Gestion du temps planifié
@@ -580,39 +1065,35 @@ async def cmd_duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         naive_dt = parse_time_input(time_str)
         if naive_dt is None:
             await update.message.reply_text(
-                "❌ Format d'heure invalide\\.\nExemples : `18:30` · `18:30 25/07`",
-                parse_mode="MarkdownV2"
+                "❌ Format d'heure invalide\\.\nExemples : `18:30` · `18:30 25/07`"
             )
             return
 
         tz_str_c  = challenger_p.get("timezone") or "UTC"
-        tz_c      = pytz.timezone(tz_str_c)
-        aware_dt  = tz_c.localize(naive_dt)
-        now_utc   = datetime.now(pytz.utc)
+        tz_c      = _tz(tz_str_c)
+        aware_dt  = naive_dt.replace(tzinfo=tz_c)
+        now_utc   = datetime.fromtimestamp(now, timezone.utc)
 
         if aware_dt < now_utc + timedelta(minutes=2):
             await update.message.reply_text(
-                "❌ L'heure planifiée doit être dans au moins 2 minutes dans le futur\\.",
-                parse_mode="MarkdownV2"
+                "❌ L'heure planifiée doit être dans au moins 2 minutes dans le futur\\."
             )
             return
 
         scheduled_ts  = aware_dt.timestamp()
         tz_str_t      = target_p.get("timezone") or "UTC"
-        tz_t          = pytz.timezone(tz_str_t)
-        dt_challenger = aware_dt.astimezone(tz_c)
+        tz_t          = _tz(tz_str_t)
+        dt_challenger = aware_dt
         dt_challenged = aware_dt.astimezone(tz_t)
-        lbl_c  = TZ_STR_TO_LABEL.get(tz_str_c, tz_str_c)
-        lbl_t  = TZ_STR_TO_LABEL.get(tz_str_t, tz_str_t)
-        off_c  = get_offset_str(tz_str_c)
-        off_t  = get_offset_str(tz_str_t)
+        lbl_c, off_c = tz_display(tz_str_c)
+        lbl_t, off_t = tz_display(tz_str_t)
 
-        cname  = esc(challenger.username or challenger.first_name)
+        cname  = esc_display_name(challenger)
         tname  = esc(target_username)
         display_info = (
             f"\n\n🗓️ *Heure du duel :*\n"
-            f"  📍 @{cname} : `{esc(dt_challenger.strftime('%d/%m/%Y %H:%M'))}` _{esc(lbl_c)} \\({esc(off_c)}\\)_\n"
-            f"  📍 @{tname} : `{esc(dt_challenged.strftime('%d/%m/%Y %H:%M'))}` _{esc(lbl_t)} \\({esc(off_t)}\\)_\n"
+            f"  📍 @{cname} : `{esc(dt_challenger.strftime('%d/%m/%Y %H:%M'))}` _{lbl_c} \\({off_c}\\)_\n"
+            f"  📍 @{tname} : `{esc(dt_challenged.strftime('%d/%m/%Y %H:%M'))}` _{lbl_t} \\({off_t}\\)_\n"
         )
         if not target_p.get("timezone"):
             display_info += f"\n⚠️ @{tname} n'a pas défini son fuseau \\(`/settimezone`\\)\\."
@@ -623,66 +1104,87 @@ async def cmd_duel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     data["duels"][duel_key] = {
         "challenger_id":      challenger.id,
-        "challenger_name":    challenger.username or challenger.first_name,
+        "challenger_name":    display_name(challenger),
         "challenger_channel": challenger_p["channel_id"],
         "challenged_id":      target_uid,
         "challenged_name":    target_p["username"],
         "challenged_channel": target_p["channel_id"],
         "status":             "pending",
-        "created_at":         time.time(),
+        "created_at":         now,
         "scheduled_ts":       scheduled_ts,
         "penalty_flag":       {},
         "videos_posted":      {}   # user_id → {"size": x, "ts": t}
     }
+    _index_participants(duel_key, data["duels"][duel_key])
+    _index_pending(duel_key, data["duels"][duel_key])
     save_data(data)
 
-    cname = esc(challenger.username or challenger.first_name)
+    cname = esc_display_name(challenger)
     tname = esc(target_p["username"])
     ch_c  = esc(challenger_p.get("channel_name", "son canal"))
     ch_t  = esc(target_p.get("channel_name", "son canal"))
 
     if scheduled_ts:
-        msg = (
-            f"⚔️ *DÉFI PLANIFIÉ \\!*\n\n"
-            f"@{cname} 🆚 @{tname}\n\n"
-            f"📺 Canal de @{cname} : *{ch_c}*\n"
-            f"📺 Canal de @{tname} : *{ch_t}*"
-            f"{display_info}\n\n"
-            f"@{tname}, réponds avec `/accept` ou `/decline`\\.\n"
-            f"⏱️ 5 minutes pour répondre\\."
+        msg = _DUEL_CHALLENGE_SCHEDULED_TMPL.format(
+            a=cname, b=tname, ch_a=ch_c, ch_b=ch_t, info=display_info
         )
     else:
-        msg = (
-            f"⚔️ *DÉFI LANCÉ \\!*\n\n"
-            f"@{cname} 🆚 @{tname}\n\n"
-            f"📺 Canal de @{cname} : *{ch_c}*\n"
-            f"📺 Canal de @{tname} : *{ch_t}*\n\n"
-            f"@{tname}, réponds avec `/accept` pour accepter "
-            f"ou `/decline` pour refuser\\.\n"
-            f"⏱️ 5 minutes pour répondre\\."
-        )
+        msg = _DUEL_CHALLENGE_TMPL.format(a=cname, b=tname, ch_a=ch_c, ch_b=ch_t)
 
-    await update.message.reply_text(msg, parse_mode="MarkdownV2")
-    asyncio.create_task(duel_accept_timeout(context.bot, duel_key))
+    await update.message.reply_text(msg)
+    schedule_timer(now + ACCEPT_TIMEOUT, duel_key, "accept", now)
 
 
 # ─────────────────────────────────────────────
 #  /accept
 # ─────────────────────────────────────────────
 
+# Annonce de début de duel (immédiat ou planifié) ; noms et canaux déjà échappés
+_DUEL_START_TMPL = (
+    "🔥 *{title} \\!*\n\n"
+    "⚔️ @{a} 🆚 @{b}\n\n"
+    "📺 *Canaux surveillés :*\n"
+    "  • @{a} poste dans *{ch_a}*\n"
+    "  • @{b} poste dans *{ch_b}*\n\n"
+    "⏱️ *5 minutes* pour poster une vidéo \\!\n"
+    "🎬 Vidéo ≥ 70 Mo en premier \\= *victoire \\+3 pts*\n"
+    "⚠️ Vidéo \\< 70 Mo \\= *\\-3 pts* \\(rattrapable \\+6 pts\\)\n\n"
+    "🏁 Le bot annoncera le vainqueur ici{outro} \\!"
+)
+
+_DUEL_SCHEDULED_TMPL = (
+    "✅ *DUEL PLANIFIÉ CONFIRMÉ \\!*\n\n"
+    "⚔️ @{a} 🆚 @{b}\n\n"
+    "📺 *Canaux de duel :*\n"
+    "  • @{a} poste dans *{ch_a}*\n"
+    "  • @{b} poste dans *{ch_b}*\n\n"
+    "🕐 *Début du duel :*\n"
+    "  • @{a} : `{dt_a}` _{lbl_a} \\({off_a}\\)_\n"
+    "  • @{b} : `{dt_b}` _{lbl_b} \\({off_b}\\)_\n\n"
+    "⏳ Début dans *{min}min {sec:02d}s*\n"
+    "📢 Rappel 5 minutes avant \\!"
+)
+
+
+async def reply_and_announce(update: Update, context: ContextTypes.DEFAULT_TYPE, msg: str):
+    """Répond à la commande et relaie le message dans le groupe principal (sans doublon)."""
+    await update.message.reply_text(msg)
+    try:
+        if update.effective_chat.id != MAIN_GROUP_ID:
+            await context.bot.send_message(MAIN_GROUP_ID, msg)
+    except Exception:
+        pass
+
+
 async def cmd_accept(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     data = load_data()
+    now  = time.time()
 
-    active_key, active_duel = None, None
-    for key, duel in data.get("duels", {}).items():
-        if duel["challenged_id"] == user.id and duel["status"] == "pending":
-            active_key  = key
-            active_duel = duel
-            break
+    active_key, active_duel = get_pending_duel(data, user.id)
 
     if not active_duel:
-        await update.message.reply_text("❌ Tu n'as aucun duel en attente\\.", parse_mode="MarkdownV2")
+        await update.message.reply_text("❌ Tu n'as aucun duel en attente\\.")
         return
 
     cname  = esc(active_duel["challenger_name"])
@@ -692,151 +1194,125 @@ async def cmd_accept(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     scheduled_ts = active_duel.get("scheduled_ts")
 
+    _unindex_pending(active_key, active_duel)
+
     if scheduled_ts:
         active_duel["status"] = "scheduled"
         save_data(data)
 
-        now_utc      = datetime.now(pytz.utc)
-        start_dt_utc = datetime.fromtimestamp(scheduled_ts, tz=pytz.utc)
+        now_utc      = datetime.fromtimestamp(now, timezone.utc)
+        start_dt_utc = datetime.fromtimestamp(scheduled_ts, tz=timezone.utc)
         delta        = start_dt_utc - now_utc
         min_until    = int(delta.total_seconds() // 60)
         sec_until    = int(delta.total_seconds() % 60)
 
         p1    = data["players"].get(str(active_duel["challenger_id"]), {})
         p2    = data["players"].get(str(active_duel["challenged_id"]), {})
-        tz1   = pytz.timezone(p1.get("timezone") or "UTC")
-        tz2   = pytz.timezone(p2.get("timezone") or "UTC")
+        tz1   = _tz(p1.get("timezone") or "UTC")
+        tz2   = _tz(p2.get("timezone") or "UTC")
         dt1   = start_dt_utc.astimezone(tz1)
         dt2   = start_dt_utc.astimezone(tz2)
-        lbl1  = TZ_STR_TO_LABEL.get(p1.get("timezone") or "UTC", "UTC")
-        lbl2  = TZ_STR_TO_LABEL.get(p2.get("timezone") or "UTC", "UTC")
-        off1  = get_offset_str(p1.get("timezone") or "UTC")
-        off2  = get_offset_str(p2.get("timezone") or "UTC")
-
-        msg = (
-            f"✅ *DUEL PLANIFIÉ CONFIRMÉ \\!*\n\n"
-            f"⚔️ @{cname} 🆚 @{chname}\n\n"
-            f"📺 *Canaux de duel :*\n"
-            f"  • @{cname} poste dans *{ch_c}*\n"
-            f"  • @{chname} poste dans *{ch_t}*\n\n"
-            f"🕐 *Début du duel :*\n"
-            f"  • @{cname} : `{esc(dt1.strftime('%d/%m/%Y %H:%M'))}` _{esc(lbl1)} \\({esc(off1)}\\)_\n"
-            f"  • @{chname} : `{esc(dt2.strftime('%d/%m/%Y %H:%M'))}` _{esc(lbl2)} \\({esc(off2)}\\)_\n\n"
-            f"⏳ Début dans *{esc(min_until)}min {sec_until:02d}s*\n"
-            f"📢 Rappel 5 minutes avant \\!"
+        lbl1, off1 = tz_display(p1.get("timezone") or "UTC")
+        lbl2, off2 = tz_display(p2.get("timezone") or "UTC")
+
+        msg = _DUEL_SCHEDULED_TMPL.format(
+            a=cname, b=chname, ch_a=ch_c, ch_b=ch_t,
+            dt_a=esc(dt1.strftime('%d/%m/%Y %H:%M')), lbl_a=lbl1, off_a=off1,
+            dt_b=esc(dt2.strftime('%d/%m/%Y %H:%M')), lbl_b=lbl2, off_b=off2,
+            min=esc(min_until), sec=sec_until
         )
-        await update.message.reply_text(msg, parse_mode="MarkdownV2")
-        try:
-            if update.effective_chat.id != MAIN_GROUP_ID:
-                await context.bot.send_message(MAIN_GROUP_ID, msg, parse_mode="MarkdownV2")
-        except Exception:
-            pass
-        asyncio.create_task(scheduled_duel_start(context.bot, active_key, scheduled_ts))
+        await reply_and_announce(update, context, msg)
+        schedule_scheduled_duel(active_key, scheduled_ts)
 
     else:
         active_duel["status"]     = "active"
-        active_duel["started_at"] = time.time()
+        active_duel["started_at"] = now
+        refresh_watched_chats(data)
         save_data(data)
 
-        msg = (
-            f"🔥 *DUEL COMMENCÉ \\!*\n\n"
-            f"⚔️ @{cname} 🆚 @{chname}\n\n"
-            f"📺 *Canaux surveillés :*\n"
-            f"  • @{cname} poste dans *{ch_c}*\n"
-            f"  • @{chname} poste dans *{ch_t}*\n\n"
-            f"⏱️ *5 minutes* pour poster une vidéo \\!\n"
-            f"🎬 Vidéo ≥ 70 Mo en premier \\= *victoire \\+3 pts*\n"
-            f"⚠️ Vidéo \\< 70 Mo \\= *\\-3 pts* \\(rattrapable \\+6 pts\\)\n\n"
-            f"🏁 Le bot annoncera le vainqueur ici dès qu'une vidéo valide est postée \\!"
+        msg = _DUEL_START_TMPL.format(
+            title="DUEL COMMENCÉ", a=cname, b=chname, ch_a=ch_c, ch_b=ch_t,
+            outro=" dès qu'une vidéo valide est postée"
         )
-        await update.message.reply_text(msg, parse_mode="MarkdownV2")
-        try:
-            if update.effective_chat.id != MAIN_GROUP_ID:
-                await context.bot.send_message(MAIN_GROUP_ID, msg, parse_mode="MarkdownV2")
-        except Exception:
-            pass
-        asyncio.create_task(duel_video_timeout(context.bot, active_key))
+        await reply_and_announce(update, context, msg)
+        schedule_timer(now + DUEL_TIMEOUT, active_key, "video", now)
 
 
 # ─────────────────────────────────────────────
 #  /decline & /cancel
 # ─────────────────────────────────────────────
 
+_MSG_DECLINE_NONE = "❌ Tu n'as aucun duel en attente à refuser\\."
+_MSG_DECLINE_TMPL = "❌ @{user} a refusé le duel de @{challenger}\\."
+_MSG_CANCEL_NONE  = "❌ Tu n'as aucun duel actif à annuler\\."
+_MSG_CANCEL_TMPL  = "🚫 Duel @{challenger} 🆚 @{challenged} annulé par @{user}\\."
+
+
 async def cmd_decline(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     data = load_data()
-    for key, duel in list(data.get("duels", {}).items()):
-        if duel["challenged_id"] == user.id and duel["status"] == "pending":
-            cname = esc(duel["challenger_name"])
-            uname = esc(user.username or user.first_name)
-            del data["duels"][key]
-            save_data(data)
-            msg = f"❌ @{uname} a refusé le duel de @{cname}\\."
-            await update.message.reply_text(msg, parse_mode="MarkdownV2")
-            try:
-                await context.bot.send_message(MAIN_GROUP_ID, msg, parse_mode="MarkdownV2")
-            except Exception:
-                pass
-            return
-    await update.message.reply_text("❌ Tu n'as aucun duel en attente à refuser\\.", parse_mode="MarkdownV2")
+    key, duel = get_pending_duel(data, user.id)
+    if not duel:
+        await update.message.reply_text(_MSG_DECLINE_NONE)
+        return
+    _remove_duel(data, key)
+    save_data(data)
+    await reply_and_announce(update, context, _MSG_DECLINE_TMPL.format(
+        user=esc_display_name(user), challenger=esc(duel["challenger_name"])
+    ))
 
 
 async def cmd_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     data = load_data()
-    for key, duel in list(data.get("duels", {}).items()):
-        if user.id in [duel["challenger_id"], duel["challenged_id"]]:
-            cname = esc(duel["challenger_name"])
-            tname = esc(duel["challenged_name"])
-            uname = esc(user.username or user.first_name)
-            del data["duels"][key]
-            save_data(data)
-            msg = f"🚫 Duel @{cname} 🆚 @{tname} annulé par @{uname}\\."
-            await update.message.reply_text(msg, parse_mode="MarkdownV2")
-            try:
-                await context.bot.send_message(MAIN_GROUP_ID, msg, parse_mode="MarkdownV2")
-            except Exception:
-                pass
-            return
-    await update.message.reply_text("❌ Tu n'as aucun duel actif à annuler\\.", parse_mode="MarkdownV2")
+    key, duel = get_user_duel(data, user.id)
+    if not duel:
+        await update.message.reply_text(_MSG_CANCEL_NONE)
+        return
+    _remove_duel(data, key)
+    save_data(data)
+    await reply_and_announce(update, context, _MSG_CANCEL_TMPL.format(
+        challenger=esc(duel["challenger_name"]), challenged=esc(duel["challenged_name"]),
+        user=esc_display_name(user)
+    ))
 
 
 # ─────────────────────────────────────────────
 #  DUEL PLANIFIÉ — démarrage automatique
 # ─────────────────────────────────────────────
 
-async def scheduled_duel_start(bot, duel_key: str, scheduled_ts: float):
-    now         = time.time()
-    reminder_ts = scheduled_ts - 300
+def schedule_scheduled_duel(duel_key: str, scheduled_ts: float):
+    """Programme le rappel (5 min avant, si encore possible) et le démarrage d'un duel planifié."""
+    if scheduled_ts - 300 > time.time():
+        schedule_timer(scheduled_ts - 300, duel_key, "reminder", scheduled_ts)
+    schedule_timer(scheduled_ts, duel_key, "start", scheduled_ts)
 
-    if reminder_ts > now:
-        await asyncio.sleep(reminder_ts - now)
-        data = load_data()
-        if duel_key not in data.get("duels", {}) or data["duels"][duel_key]["status"] != "scheduled":
-            return
-        duel = data["duels"][duel_key]
-        try:
-            await bot.send_message(
-                MAIN_GROUP_ID,
-                f"⏰ *RAPPEL — 5 minutes \\!*\n\n"
-                f"⚔️ @{esc(duel['challenger_name'])} 🆚 @{esc(duel['challenged_name'])}\n"
-                f"Le duel commence dans *5 minutes* \\! Préparez vos vidéos 🎬",
-                parse_mode="MarkdownV2"
-            )
-        except Exception:
-            pass
 
-    remaining = scheduled_ts - time.time()
-    if remaining > 0:
-        await asyncio.sleep(remaining)
+async def scheduled_duel_reminder(bot, duel_key: str, scheduled_ts: float):
+    duel = load_data()["duels"].get(duel_key)
+    if duel is None or duel["status"] != "scheduled" or duel["scheduled_ts"] != scheduled_ts:
+        return
+    try:
+        await bot.send_message(
+            MAIN_GROUP_ID,
+            f"⏰ *RAPPEL — 5 minutes \\!*\n\n"
+            f"⚔️ @{esc(duel['challenger_name'])} 🆚 @{esc(duel['challenged_name'])}\n"
+            f"Le duel commence dans *5 minutes* \\! Préparez vos vidéos 🎬"
+        )
+    except Exception:
+        pass
+
 
+async def scheduled_duel_start(bot, duel_key: str, scheduled_ts: float):
     data = load_data()
-    if duel_key not in data.get("duels", {}) or data["duels"][duel_key]["status"] != "scheduled":
+    duel = data["duels"].get(duel_key)
+    if duel is None or duel["status"] != "scheduled" or duel["scheduled_ts"] != scheduled_ts:
         return
 
-    duel = data["duels"][duel_key]
+    now = time.time()
     duel["status"]     = "active"
-    duel["started_at"] = time.time()
+    duel["started_at"] = now
+    refresh_watched_chats(data)
     save_data(data)
 
     p1    = data["players"].get(str(duel["challenger_id"]), {})
@@ -846,22 +1322,14 @@ async def scheduled_duel_start(bot, duel_key: str, scheduled_ts: float):
     cname = esc(duel["challenger_name"])
     tname = esc(duel["challenged_name"])
 
-    msg = (
-        f"🔥 *LE DUEL COMMENCE \\!*\n\n"
-        f"⚔️ @{cname} 🆚 @{tname}\n\n"
-        f"📺 *Canaux surveillés :*\n"
-        f"  • @{cname} poste dans *{ch_c}*\n"
-        f"  • @{tname} poste dans *{ch_t}*\n\n"
-        f"⏱️ *5 minutes* pour poster une vidéo \\!\n"
-        f"🎬 Vidéo ≥ 70 Mo en premier \\= *victoire \\+3 pts*\n"
-        f"⚠️ Vidéo \\< 70 Mo \\= *\\-3 pts* \\(rattrapable \\+6 pts\\)\n\n"
-        f"🏁 Le bot annoncera le vainqueur ici \\!"
+    msg = _DUEL_START_TMPL.format(
+        title="LE DUEL COMMENCE", a=cname, b=tname, ch_a=ch_c, ch_b=ch_t, outro=""
     )
     try:
-        await bot.send_message(MAIN_GROUP_ID, msg, parse_mode="MarkdownV2")
+        await bot.send_message(MAIN_GROUP_ID, msg)
     except Exception:
         pass
-    asyncio.create_task(duel_video_timeout(bot, duel_key))
+    schedule_timer(now + DUEL_TIMEOUT, duel_key, "video", now)
 
 
 # ─────────────────────────────────────────────
@@ -871,6 +1339,84 @@ async def scheduled_duel_start(bot, duel_key: str, scheduled_ts: float):
 #  On identifie le joueur par l'ID du canal.
 # ─────────────────────────────────────────────
 
+class _VideoFilter(filters.MessageFilter):
+    """Vidéo native ou document video/mp4 postée dans un canal surveillé.
+
+    Le test du canal est fait ici plutôt que dans handle_video : PTB ne crée
+    aucune tâche pour les vidéos des canaux sans duel ni rank actif.
+    """
+
+    def filter(self, message) -> bool:
+        chat_id = message.chat_id
+        if chat_id not in _ACTIVE_BY_CHAT and chat_id not in _RANK_CHATS:
+            return False
+        if message.video:
+            return True
+        doc = message.document
+        return doc is not None and doc.mime_type == "video/mp4"
+
+
+VIDEO_FILTER = _VideoFilter(name="VIDEO_FILTER")
+
+# Horodatage des vidéos (heure locale du serveur) : time.strftime direct, sans construire de datetime
+POST_TIME_FMT = "%d/%m/%Y à %H:%M:%S"
+
+
+def format_post_time(ts: float) -> str:
+    return time.strftime(POST_TIME_FMT, time.localtime(ts))
+
+
+# Annonces HTML de handle_video (texte brut en secours si l'envoi HTML échoue)
+_PENALTY_TMPL = (
+    "⚠️ <b>Petite vidéo détectée !</b>\n\n"
+    "👤 @{poster}\n"
+    "📺 Canal : <b>{chat}</b>\n"
+    "📦 Taille : <b>{size_mb:.2f} Mo</b> (minimum : 70 Mo)\n"
+    "🕐 Heure : <code>{time}</code>\n\n"
+    "💸 <b>-3 points</b> pour @{poster}\n"
+    "⚡ Il peut encore poster une vidéo ≥ 70 Mo avant @{opponent} pour gagner <b>+6 pts</b> !"
+)
+_PENALTY_PLAIN_TMPL = "⚠️ Petite vidéo de @{poster} : {size_mb:.2f} Mo (< 70 Mo)\n-3 points !"
+
+_VICTORY_BONUS = "\n🔥 <b>Bonus rattrapage !</b> (pénalité petite vidéo compensée)"
+_VICTORY_LOSER_TMPL = (
+    "\n\n📋 <b>Vidéo de @{opponent} :</b>\n"
+    "  🕐 Heure : <code>{time}</code>\n"
+    "  📦 Taille : <b>{size_mb:.2f} Mo</b>\n"
+    "  ⏳ Retard : <b>{gap_min}min {gap_sec:02d}s</b> après le vainqueur"
+)
+_VICTORY_TMPL = (
+    "🏆 <b>DUEL TERMINÉ — VICTOIRE !</b>\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "⚔️ @{challenger} 🆚 @{challenged}\n\n"
+    "🥇 <b>VAINQUEUR : @{winner}</b>{bonus}\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "📋 <b>Preuve de victoire :</b>\n\n"
+    "  👤 Vainqueur : @{winner}\n"
+    "  📺 Canal : <b>{chat}</b>\n"
+    "  📦 Taille vidéo : <b>{size_mb:.2f} Mo</b>\n"
+    "  🕐 Heure de publication : <code>{time}</code>\n"
+    "  ⏱️ Temps depuis le début : <b>{elapsed_min}min {elapsed_sec:02d}s</b>"
+    "{loser_info}\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "📊 <b>Mise à jour des scores :</b>\n\n"
+    "  ✅ @{winner} : <b>+{won} pts</b> → Total : <b>{total_winner} pts</b>\n"
+    "  ❌ @{loser} : <b>{lost} pt</b> → Total : <b>{total_loser} pts</b>\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
+    "🏅 Tape /top pour voir le classement !"
+)
+_VICTORY_PLAIN_TMPL = (
+    "🏆 DUEL TERMINÉ — VICTOIRE !\n\n"
+    "⚔️ {challenger} vs {challenged}\n\n"
+    "🥇 VAINQUEUR : @{winner}\n"
+    "📦 Taille vidéo : {size_mb:.2f} Mo\n"
+    "🕐 Heure : {time}\n"
+    "⏱️ Durée : {elapsed_min}min {elapsed_sec:02d}s\n\n"
+    "✅ @{winner} : +{won} pts (Total: {total_winner} pts)\n"
+    "❌ @{loser} : {lost} pt (Total: {total_loser} pts)"
+)
+
+
 async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Accepter les posts de canaux ET les messages normaux
     msg = update.channel_post or update.message
@@ -888,237 +1434,248 @@ async def handle_video(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if video_size == 0:
         return
 
-    logger.info(f"📹 Vidéo reçue — chat_id={chat_id}, size={video_size}, update_type={'channel_post' if update.channel_post else 'message'}")
+    # Journalisation paresseuse (%s) : rien n'est formaté si le niveau est filtré
+    logger.info(
+        "📹 Vidéo reçue — chat_id=%s, size=%s, update_type=%s",
+        chat_id, video_size, "channel_post" if update.channel_post else "message"
+    )
 
-    import time as _t
-    post_ts = _t.time()
+    post_ts = time.time()
 
     # Vérifier d'abord si ce canal est dans un rank actif
-    data = load_data()
-    for rid, r in data.get("ranks", {}).items():
-        if r["status"] == "active":
-            for rp in r["players"]:
-                if rp["channel_id"] == chat_id:
-                    await handle_rank_video(context.bot, chat_id, video_size, post_ts)
-                    return
+    if chat_id in _RANK_CHATS:
+        await handle_rank_video(context.bot, chat_id, video_size, post_ts)
+        return
 
+    duel_key = _ACTIVE_BY_CHAT.get(chat_id)
+    if not duel_key:
+        return
     data = load_data()
+    duel = data["duels"][duel_key]
+    challenger_channel = duel.get("challenger_channel")
+    logger.debug("⚔️ Duel %s: canal_A=%s canal_B=%s", duel_key, challenger_channel, duel.get("challenged_channel"))
+
+    # Identifier le joueur par son canal (pas par l'user)
+    if chat_id == challenger_channel:
+        poster_id     = duel["challenger_id"]
+        poster_name   = duel["challenger_name"]
+        opponent_id   = duel["challenged_id"]
+        opponent_name = duel["challenged_name"]
+    else:
+        poster_id     = duel["challenged_id"]
+        poster_name   = duel["challenged_name"]
+        opponent_id   = duel["challenger_id"]
+        opponent_name = duel["challenger_name"]
+    poster_key   = str(poster_id)
+    opponent_key = str(opponent_id)
+    # Les deux joueurs existent déjà (inscrits avant le duel) : get_player seulement en secours
+    players      = data["players"]
+
+    is_big     = video_size >= VIDEO_MIN_SIZE
+    size_mb    = video_size / (1024 * 1024)
+    chat_title = msg.chat.title or str(chat_id)
+
+    # Heure exacte de publication (à la seconde), lue une seule fois
+    now_ts        = post_ts
+    post_time_str = format_post_time(now_ts)
+
+    # Enregistrer le timestamp de cette vidéo dans le duel
+    duel.setdefault("video_timestamps", {})[poster_key] = {
+        "ts":      now_ts,
+        "size_mb": round(size_mb, 2),
+        "big":     is_big,
+        "channel": chat_title
+    }
 
-    # Log tous les duels actifs pour comparaison
-    active_duels = [(k, d) for k, d in data.get("duels", {}).items() if d["status"] == "active"]
-    logger.info(f"⚔️ Duels actifs : {len(active_duels)}")
-    for k, d in active_duels:
-        logger.info(f"   Duel {k}: canal_A={d.get('challenger_channel')} canal_B={d.get('challenged_channel')}")
-        logger.info(f"   Ce chat ({chat_id}) correspond ? A={chat_id == d.get('challenger_channel')} B={chat_id == d.get('challenged_channel')}")
-
-    for duel_key, duel in list(data.get("duels", {}).items()):
-        if duel["status"] != "active":
-            continue
-
-        challenger_channel = duel.get("challenger_channel")
-        challenged_channel = duel.get("challenged_channel")
-
-        if chat_id not in [challenger_channel, challenged_channel]:
-            continue
-
-        # Identifier le joueur par son canal (pas par l'user)
-        if chat_id == challenger_channel:
-            poster_id     = duel["challenger_id"]
-            poster_name   = duel["challenger_name"]
-            opponent_id   = duel["challenged_id"]
-            opponent_name = duel["challenged_name"]
-        else:
-            poster_id     = duel["challenged_id"]
-            poster_name   = duel["challenged_name"]
-            opponent_id   = duel["challenger_id"]
-            opponent_name = duel["challenger_name"]
-
-        is_big     = video_size >= VIDEO_MIN_SIZE
-        size_mb    = video_size / (1024 * 1024)
-        chat_title = msg.chat.title or str(chat_id)
-
-        # Heure exacte de publication (à la seconde)
-        now_ts       = time.time()
-        now_dt       = datetime.now()
-        post_time_str = now_dt.strftime("%d/%m/%Y à %H:%M:%S")
-
-        # Enregistrer le timestamp de cette vidéo dans le duel
-        if "video_timestamps" not in duel:
-            duel["video_timestamps"] = {}
-        duel["video_timestamps"][str(poster_id)] = {
-            "ts":      now_ts,
-            "size_mb": round(size_mb, 2),
-            "big":     is_big,
-            "channel": chat_title
-        }
-
-        if not is_big:
-            # ── Petite vidéo → pénalité ──
-            if "penalty_flag" not in duel:
-                duel["penalty_flag"] = {}
-            duel["penalty_flag"][str(poster_id)] = True
-            get_player(data, poster_id, poster_name)
-            data["players"][str(poster_id)]["points"] -= 3
-            save_data(data)
+    if not is_big:
+        # ── Petite vidéo → pénalité ──
+        duel.setdefault("penalty_flag", {})[poster_key] = True
+        (players.get(poster_key) or get_player(data, poster_id, poster_name))["points"] -= 3
+        save_data(data)
 
+        try:
+            await context.bot.send_message(
+                MAIN_GROUP_ID,
+                _PENALTY_TMPL.format(
+                    poster=h(poster_name), opponent=h(opponent_name), chat=h(chat_title),
+                    size_mb=size_mb, time=h(post_time_str)
+                ),
+                parse_mode="HTML"
+            )
+            logger.info("✅ Message pénalité envoyé dans %s", MAIN_GROUP_ID)
+        except Exception as e:
+            logger.error("Erreur pénalité HTML: %s", e)
             try:
                 await context.bot.send_message(
                     MAIN_GROUP_ID,
-                    f"⚠️ <b>Petite vidéo détectée !</b>\n\n"
-                    f"👤 @{h(poster_name)}\n"
-                    f"📺 Canal : <b>{h(chat_title)}</b>\n"
-                    f"📦 Taille : <b>{size_mb:.2f} Mo</b> (minimum : 70 Mo)\n"
-                    f"🕐 Heure : <code>{h(post_time_str)}</code>\n\n"
-                    f"💸 <b>-3 points</b> pour @{h(poster_name)}\n"
-                    f"⚡ Il peut encore poster une vidéo ≥ 70 Mo avant @{h(opponent_name)} pour gagner <b>+6 pts</b> !",
-                    parse_mode="HTML"
+                    _PENALTY_PLAIN_TMPL.format(poster=poster_name, size_mb=size_mb),
+                    parse_mode=None
                 )
-                logger.info(f"✅ Message pénalité envoyé dans {MAIN_GROUP_ID}")
-            except Exception as e:
-                logger.error(f"Erreur pénalité HTML: {e}")
-                try:
-                    await context.bot.send_message(
-                        MAIN_GROUP_ID,
-                        f"⚠️ Petite vidéo de @{poster_name} : {size_mb:.2f} Mo (< 70 Mo)\n-3 points !"
-                    )
-                except Exception as e2:
-                    logger.error(f"Erreur pénalité texte: {e2} — MAIN_GROUP_ID={MAIN_GROUP_ID}")
+            except Exception as e2:
+                logger.error("Erreur pénalité texte: %s — MAIN_GROUP_ID=%s", e2, MAIN_GROUP_ID)
 
-        else:
-            # ── Grande vidéo ≥ 70 Mo → VICTOIRE ──
-            had_penalty = duel.get("penalty_flag", {}).get(str(poster_id), False)
-            points_won  = 6 if had_penalty else 3
-            points_lost = -1
-
-            # Chrono depuis le début du duel
-            duel_start   = duel.get("started_at", now_ts)
-            elapsed      = int(now_ts - duel_start)
-            elapsed_min  = elapsed // 60
-            elapsed_sec  = elapsed % 60
-
-            # Infos sur la vidéo du perdant si elle existe
-            loser_video = duel.get("video_timestamps", {}).get(str(opponent_id))
-            loser_info  = ""
-            if loser_video:
-                loser_dt       = datetime.fromtimestamp(loser_video["ts"])
-                loser_str      = loser_dt.strftime("%d/%m/%Y à %H:%M:%S")
-                loser_size_str = f"{loser_video['size_mb']:.2f}"
-                gap            = int(now_ts - loser_video["ts"])
-                gap_min        = gap // 60
-                gap_sec        = gap % 60
-                loser_info = (
-                    f"\n\n📋 <b>Vidéo de @{h(opponent_name)} :</b>\n"
-                    f"  🕐 Heure : <code>{h(loser_str)}</code>\n"
-                    f"  📦 Taille : <b>{loser_size_str} Mo</b>\n"
-                    f"  ⏳ Retard : <b>{gap_min}min {gap_sec:02d}s</b> après le vainqueur"
-                )
+    else:
+        # ── Grande vidéo ≥ 70 Mo → VICTOIRE ──
+        had_penalty = duel.get("penalty_flag", {}).get(poster_key, False)
+        points_won  = 6 if had_penalty else 3
+        points_lost = -1
+
+        # Chrono depuis le début du duel
+        duel_start   = duel.get("started_at", now_ts)
+        elapsed      = int(now_ts - duel_start)
+        elapsed_min  = elapsed // 60
+        elapsed_sec  = elapsed % 60
+
+        # Infos sur la vidéo du perdant si elle existe
+        loser_video = duel["video_timestamps"].get(opponent_key)
+        loser_info  = ""
+        if loser_video:
+            loser_str  = format_post_time(loser_video["ts"])
+            gap        = int(now_ts - loser_video["ts"])
+            loser_info = _VICTORY_LOSER_TMPL.format(
+                opponent=h(opponent_name), time=h(loser_str), size_mb=loser_video["size_mb"],
+                gap_min=gap // 60, gap_sec=gap % 60
+            )
 
-            get_player(data, poster_id, poster_name)
-            get_player(data, opponent_id, opponent_name)
-
-            data["players"][str(poster_id)]["points"]          += points_won
-            data["players"][str(poster_id)]["wins"]             = data["players"][str(poster_id)].get("wins", 0) + 1
-            data["players"][str(poster_id)]["duels_played"]     = data["players"][str(poster_id)].get("duels_played", 0) + 1
-            data["players"][str(opponent_id)]["points"]        += points_lost
-            data["players"][str(opponent_id)]["losses"]         = data["players"][str(opponent_id)].get("losses", 0) + 1
-            data["players"][str(opponent_id)]["duels_played"]   = data["players"][str(opponent_id)].get("duels_played", 0) + 1
-
-            total_winner   = data["players"][str(poster_id)]["points"]
-            total_opponent = data["players"][str(opponent_id)]["points"]
-
-            data["history"].append({
-                "winner":        poster_name,
-                "loser":         opponent_name,
-                "points_won":    points_won,
-                "date":          now_dt.isoformat(),
-                "video_size_mb": round(size_mb, 2),
-                "elapsed_sec":   elapsed
-            })
-            del data["duels"][duel_key]
-            save_data(data)
+        winner = players.get(poster_key) or get_player(data, poster_id, poster_name)
+        loser  = players.get(opponent_key) or get_player(data, opponent_id, opponent_name)
+
+        winner["points"]       += points_won
+        winner["wins"]          = winner.get("wins", 0) + 1
+        winner["duels_played"]  = winner.get("duels_played", 0) + 1
+        loser["points"]        += points_lost
+        loser["losses"]         = loser.get("losses", 0) + 1
+        loser["duels_played"]   = loser.get("duels_played", 0) + 1
+
+        total_winner   = winner["points"]
+        total_opponent = loser["points"]
+
+        add_history(data, {
+            "winner":        poster_name,
+            "loser":         opponent_name,
+            "points_won":    points_won,
+            "date":          datetime.fromtimestamp(now_ts).isoformat(),
+            "video_size_mb": round(size_mb, 2),
+            "elapsed_sec":   elapsed
+        })
+        _remove_duel(data, duel_key)
+        save_data(data)
 
-            bonus_txt = "\n🔥 <b>Bonus rattrapage !</b> (pénalité petite vidéo compensée)" if had_penalty else ""
-
-            victory_msg = (
-                f"🏆 <b>DUEL TERMINÉ — VICTOIRE !</b>\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
-                f"⚔️ @{h(duel['challenger_name'])} 🆚 @{h(duel['challenged_name'])}\n\n"
-                f"🥇 <b>VAINQUEUR : @{h(poster_name)}</b>{bonus_txt}\n\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📋 <b>Preuve de victoire :</b>\n\n"
-                f"  👤 Vainqueur : @{h(poster_name)}\n"
-                f"  📺 Canal : <b>{h(chat_title)}</b>\n"
-                f"  📦 Taille vidéo : <b>{size_mb:.2f} Mo</b>\n"
-                f"  🕐 Heure de publication : <code>{h(post_time_str)}</code>\n"
-                f"  ⏱️ Temps depuis le début : <b>{elapsed_min}min {elapsed_sec:02d}s</b>"
-                f"{loser_info}\n\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"📊 <b>Mise à jour des scores :</b>\n\n"
-                f"  ✅ @{h(poster_name)} : <b>+{points_won} pts</b> → Total : <b>{total_winner} pts</b>\n"
-                f"  ❌ @{h(opponent_name)} : <b>{points_lost} pt</b> → Total : <b>{total_opponent} pts</b>\n\n"
-                f"━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n"
-                f"🏅 Tape /top pour voir le classement !"
-            )
+        fields = dict(
+            challenger=duel["challenger_name"], challenged=duel["challenged_name"],
+            winner=poster_name, loser=opponent_name, chat=chat_title, time=post_time_str,
+            size_mb=size_mb, elapsed_min=elapsed_min, elapsed_sec=elapsed_sec,
+            won=points_won, lost=points_lost, total_winner=total_winner, total_loser=total_opponent
+        )
+        # Version HTML : seuls les champs texte sont échappés, les nombres passent tels quels
+        victory_msg = _VICTORY_TMPL.format(
+            **{k: h(v) if isinstance(v, str) else v for k, v in fields.items()},
+            bonus=_VICTORY_BONUS if had_penalty else "", loser_info=loser_info
+        )
 
+        try:
+            await context.bot.send_message(MAIN_GROUP_ID, victory_msg, parse_mode="HTML")
+            logger.info("✅ Message victoire envoyé dans %s", MAIN_GROUP_ID)
+        except Exception as e:
+            logger.error("Erreur victoire HTML: %s", e)
+            # Fallback: texte brut sans formatage
             try:
-                await context.bot.send_message(MAIN_GROUP_ID, victory_msg, parse_mode="HTML")
-                logger.info(f"✅ Message victoire envoyé dans {MAIN_GROUP_ID}")
-            except Exception as e:
-                logger.error(f"Erreur victoire HTML: {e}")
-                # Fallback: texte brut sans formatage
-                try:
-                    plain = (
-                        f"🏆 DUEL TERMINÉ — VICTOIRE !\n\n"
-                        f"⚔️ {duel['challenger_name']} vs {duel['challenged_name']}\n\n"
-                        f"🥇 VAINQUEUR : @{poster_name}\n"
-                        f"📦 Taille vidéo : {size_mb:.2f} Mo\n"
-                        f"🕐 Heure : {post_time_str}\n"
-                        f"⏱️ Durée : {elapsed_min}min {elapsed_sec:02d}s\n\n"
-                        f"✅ @{poster_name} : +{points_won} pts (Total: {total_winner} pts)\n"
-                        f"❌ @{opponent_name} : {points_lost} pt (Total: {total_opponent} pts)"
-                    )
-                    await context.bot.send_message(MAIN_GROUP_ID, plain)
-                    logger.info("✅ Message victoire envoyé en texte brut")
-                except Exception as e2:
-                    logger.error(f"Erreur victoire texte brut: {e2} — MAIN_GROUP_ID={MAIN_GROUP_ID}")
-
-        break
+                plain = _VICTORY_PLAIN_TMPL.format(**fields)
+                await context.bot.send_message(MAIN_GROUP_ID, plain, parse_mode=None)
+                logger.info("✅ Message victoire envoyé en texte brut")
+            except Exception as e2:
+                logger.error("Erreur victoire texte brut: %s — MAIN_GROUP_ID=%s", e2, MAIN_GROUP_ID)
 
 
 # ─────────────────────────────────────────────
 #  TIMEOUTS
+#  Un seul tas (échéance, duel_key, type, marque) et une seule
+#  tâche _timer_loop() au lieu d'une tâche endormie par duel.
 # ─────────────────────────────────────────────
 
-async def duel_accept_timeout(bot, duel_key: str):
-    await asyncio.sleep(ACCEPT_TIMEOUT)
+# Les entrées ne sont jamais retirées : la marque (created_at, started_at ou scheduled_ts)
+# identifie le duel ou le rank qui les a créées. Un duel recréé par la même paire garde
+# la même clé, mais pas la même marque : l'ancienne échéance est alors ignorée.
+_TIMERS: list[tuple[float, str, str, float]] = []
+_TIMER_EVENT = asyncio.Event()
+
+# Timeouts en cours : la boucle ne garde qu'une référence faible sur les tâches créées
+_TIMER_TASKS: set[asyncio.Task] = set()
+
+
+def _timer_task_done(task: asyncio.Task):
+    _TIMER_TASKS.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Timeout %s en échec", task.get_name(), exc_info=task.exception())
+
+
+def schedule_timer(when: float, key: str, kind: str, stamp: float):
+    """Programme l'échéance `kind` (voir _TIMER_HANDLERS) d'un duel ou d'un rank pour `when`."""
+    heapq.heappush(_TIMERS, (when, key, kind, stamp))
+    _TIMER_EVENT.set()
+
+
+def restore_timers(data: dict):
+    """Reprogramme les échéances des duels et ranks en cours (après un redémarrage)."""
+    for key, duel in data.get("duels", {}).items():
+        if duel["status"] == "pending":
+            created = duel.get("created_at", 0)
+            schedule_timer(created + ACCEPT_TIMEOUT, key, "accept", created)
+        elif duel["status"] == "scheduled":
+            schedule_scheduled_duel(key, duel["scheduled_ts"])
+        elif duel["status"] == "active":
+            started = duel.get("started_at", 0)
+            schedule_timer(started + DUEL_TIMEOUT, key, "video", started)
+    for rid, r in data.get("ranks", {}).items():
+        if r["status"] == "active":
+            started = r.get("started_at", 0)
+            schedule_timer(started + RANK_TIMEOUT, rid, "rank", started)
+
+
+async def _timer_loop(bot):
+    """Tâche de fond : dort jusqu'à la prochaine échéance et déclenche les timeouts dus."""
+    while True:
+        _TIMER_EVENT.clear()
+        now = time.time()
+        while _TIMERS and _TIMERS[0][0] <= now:
+            _, key, kind, stamp = heapq.heappop(_TIMERS)
+            task = asyncio.create_task(_TIMER_HANDLERS[kind](bot, key, stamp), name=f"{kind}:{key}")
+            _TIMER_TASKS.add(task)
+            task.add_done_callback(_timer_task_done)
+        if not _TIMERS:
+            await _TIMER_EVENT.wait()
+            continue
+        try:
+            await asyncio.wait_for(_TIMER_EVENT.wait(), _TIMERS[0][0] - now)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def duel_accept_timeout(bot, duel_key: str, created_at: float):
+    # Cas courant : duel déjà terminé (ou recréé depuis) → simple lookup en mémoire, aucune écriture
     data = load_data()
-    if duel_key not in data.get("duels", {}):
-        return
-    duel = data["duels"][duel_key]
-    if duel["status"] != "pending":
+    duel = data["duels"].get(duel_key)
+    if duel is None or duel["status"] != "pending" or duel.get("created_at", 0) != created_at:
         return
-    del data["duels"][duel_key]
+    _remove_duel(data, duel_key)
     save_data(data)
     try:
         await bot.send_message(
             MAIN_GROUP_ID,
             f"⏰ @{esc(duel['challenged_name'])} n'a pas répondu au défi de @{esc(duel['challenger_name'])}\\.\n"
-            f"Duel annulé automatiquement \\(5 min écoulées\\)\\.",
-            parse_mode="MarkdownV2"
+            f"Duel annulé automatiquement \\(5 min écoulées\\)\\."
         )
     except Exception:
         pass
 
 
-async def duel_video_timeout(bot, duel_key: str):
-    await asyncio.sleep(DUEL_TIMEOUT)
+async def duel_video_timeout(bot, duel_key: str, started_at: float):
+    # Cas courant : duel déjà terminé (ou recréé depuis) → simple lookup en mémoire, aucune écriture
     data = load_data()
-    if duel_key not in data.get("duels", {}):
-        return
-    duel = data["duels"][duel_key]
-    if duel["status"] != "active":
+    duel = data["duels"].get(duel_key)
+    if duel is None or duel["status"] != "active" or duel.get("started_at", 0) != started_at:
         return
-    del data["duels"][duel_key]
+    _remove_duel(data, duel_key)
     save_data(data)
     try:
         await bot.send_message(
@@ -1126,8 +1683,7 @@ async def duel_video_timeout(bot, duel_key: str):
             f"⏰ *Timeout \\!* Le duel est terminé sans vainqueur\\.\n\n"
             f"⚔️ @{esc(duel['challenger_name'])} 🆚 @{esc(duel['challenged_name'])}\n\n"
             f"Aucun des deux n'a posté de vidéo ≥ 70 Mo dans les temps\\.\n"
-            f"*Match nul — aucun point attribué\\.*",
-            parse_mode="MarkdownV2"
+            f"*Match nul — aucun point attribué\\.*"
         )
     except Exception:
         pass
@@ -1139,7 +1695,7 @@ async def duel_video_timeout(bot, duel_key: str):
 
 async def cmd_top(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = load_data()
-    await update.message.reply_text(format_leaderboard(data), parse_mode="MarkdownV2")
+    await update.message.reply_text(format_leaderboard(data))
 
 
 async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1147,11 +1703,11 @@ async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = load_data()
     uid  = str(user.id)
 
-    if uid not in data["players"]:
-        await update.message.reply_text("❌ Inscris\\-toi d'abord avec `/join` \\!", parse_mode="MarkdownV2")
+    p    = data["players"].get(uid)
+    if p is None:
+        await update.message.reply_text("❌ Inscris\\-toi d'abord avec `/join` \\!")
         return
 
-    p    = data["players"][uid]
     name = p.get("username", user.first_name)
     tz   = p.get("timezone")
     tz_display = TZ_STR_TO_LABEL.get(tz, tz or "Non défini")
@@ -1175,80 +1731,153 @@ async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📺 Canal : *{esc(channel)}*\n"
         f"🌍 Fuseau : *{esc(tz_display)}* \\({esc(offset)}\\)\n"
     )
-    await update.message.reply_text(msg, parse_mode="MarkdownV2")
+    await update.message.reply_text(msg)
+
+
+_REGLES_MSG = (
+    "📜 *RÈGLES DES DUELS*\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n\n"
+    "1️⃣ Chaque joueur enregistre *son propre canal* avec `/mychannel`\n"
+    "2️⃣ Lance un duel avec `/duel @pseudo` depuis le groupe principal\n"
+    "3️⃣ L'adversaire accepte avec `/accept`\n"
+    "4️⃣ Chacun poste une vidéo dans *son propre canal*\n"
+    "5️⃣ Le bot détecte et annonce le vainqueur dans ce groupe \\!\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "🎬 *Système de points :*\n\n"
+    "• 1ère vidéo ≥ 70 Mo → *\\+3 pts* \\(victoire\\) / adversaire *\\-1 pt*\n"
+    "• Vidéo \\< 70 Mo → *\\-3 pts* \\(pénalité immédiate\\)\n"
+    "  ↳ Si tu postes ensuite une ≥ 70 Mo avant l'adversaire → *\\+6 pts* \\!\n"
+    "• Timeout sans vidéo valide → *match nul, 0 pt*\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "🗓️ *Duels planifiés :*\n\n"
+    "• `/duel @pseudo 20:00` — l'heure est dans *ton fuseau*\n"
+    "• L'adversaire voit l'heure dans *son fuseau*\n"
+    "• Rappel automatique 5 min avant\n"
+    "• Configure ton fuseau avec `/settimezone`\n\n"
+    "━━━━━━━━━━━━━━━━━━━━━\n"
+    "⏱️ Délai pour poster après le début : *5 minutes*\n"
+    "⏱️ Délai pour accepter un défi : *5 minutes*\n"
+)
 
 
 async def cmd_regles(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    msg = (
-        "📜 *RÈGLES DES DUELS*\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n\n"
-        "1️⃣ Chaque joueur enregistre *son propre canal* avec `/mychannel`\n"
-        "2️⃣ Lance un duel avec `/duel @pseudo` depuis le groupe principal\n"
-        "3️⃣ L'adversaire accepte avec `/accept`\n"
-        "4️⃣ Chacun poste une vidéo dans *son propre canal*\n"
-        "5️⃣ Le bot détecte et annonce le vainqueur dans ce groupe \\!\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "🎬 *Système de points :*\n\n"
-        "• 1ère vidéo ≥ 70 Mo → *\\+3 pts* \\(victoire\\) / adversaire *\\-1 pt*\n"
-        "• Vidéo \\< 70 Mo → *\\-3 pts* \\(pénalité immédiate\\)\n"
-        "  ↳ Si tu postes ensuite une ≥ 70 Mo avant l'adversaire → *\\+6 pts* \\!\n"
-        "• Timeout sans vidéo valide → *match nul, 0 pt*\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "🗓️ *Duels planifiés :*\n\n"
-        "• `/duel @pseudo 20:00` — l'heure est dans *ton fuseau*\n"
-        "• L'adversaire voit l'heure dans *son fuseau*\n"
-        "• Rappel automatique 5 min avant\n"
-        "• Configure ton fuseau avec `/settimezone`\n\n"
-        "━━━━━━━━━━━━━━━━━━━━━\n"
-        "⏱️ Délai pour poster après le début : *5 minutes*\n"
-        "⏱️ Délai pour accepter un défi : *5 minutes*\n"
-    )
-    await update.message.reply_text(msg, parse_mode="MarkdownV2")
+    await update.message.reply_text(_REGLES_MSG)
 
 
 async def cmd_resetpoints(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
+    if not context.args:
+        await update.message.reply_text("Usage: `/resetpoints @pseudo`")
+        return
     try:
-        member = await context.bot.get_chat_member(MAIN_GROUP_ID, user.id)
-        if member.status not in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
-            await update.message.reply_text("❌ Commande réservée aux admins\\.", parse_mode="MarkdownV2")
+        if not await is_group_admin(context.bot, user.id):
+            await update.message.reply_text("❌ Commande réservée aux admins\\.")
             return
     except Exception:
-        await update.message.reply_text("❌ Impossible de vérifier tes droits\\.", parse_mode="MarkdownV2")
-        return
-    if not context.args:
-        await update.message.reply_text("Usage: `/resetpoints @pseudo`", parse_mode="MarkdownV2")
+        await update.message.reply_text("❌ Impossible de vérifier tes droits\\.")
         return
     target = context.args[0].lstrip("@").lower()
     data   = load_data()
-    for uid, p in data["players"].items():
-        if p.get("username", "").lower() == target:
-            p["points"] = 0
-            save_data(data)
-            await update.message.reply_text(f"✅ Points de @{esc(target)} remis à 0\\.", parse_mode="MarkdownV2")
+    _, p   = get_player_by_username(data, target)
+    if p:
+        p["points"] = 0
+        save_data(data)
+        await update.message.reply_text(f"✅ Points de @{esc(target)} remis à 0\\.")
+        return
+    await update.message.reply_text(f"❌ Joueur @{esc(target)} introuvable\\.")
+
+
+# ─────────────────────────────────────────────
+#  /chatid & /debug — Diagnostic
+# ─────────────────────────────────────────────
+
+async def cmd_chatid(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat = update.effective_chat
+    await update.message.reply_text(f"🆔 ID de ce chat : `{esc(chat.id)}` \\({esc(chat.type)}\\)")
+
+
+async def cmd_debug(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user = update.effective_user
+    try:
+        if not await is_group_admin(context.bot, user.id):
+            await update.message.reply_text("❌ Commande réservée aux admins\\.")
             return
-    await update.message.reply_text(f"❌ Joueur @{esc(target)} introuvable\\.", parse_mode="MarkdownV2")
+    except Exception:
+        await update.message.reply_text("❌ Impossible de vérifier tes droits\\.")
+        return
+
+    data   = load_data()
+    chat   = update.effective_chat
+    duels  = data.get("duels", {})
+    ranks  = [r for r in data.get("ranks", {}).values() if r["status"] in ("open", "active")]
+    lines  = [
+        "🔍 *DEBUG*\n",
+        f"📍 Ce chat : `{esc(chat.id)}`",
+        f"🏠 Groupe principal : `{esc(MAIN_GROUP_ID)}`",
+        f"👥 Joueurs : *{len(data['players'])}* · 📺 Canaux enregistrés : *{len(data.get('registered_channels', {}))}*",
+        f"👁️ Canaux surveillés : *{len(_ACTIVE_BY_CHAT)}* duel · *{len(_RANK_CHATS)}* rank",
+        f"⏰ Échéances programmées : *{len(_TIMERS)}*",
+        f"\n⚔️ *Duels \\({len(duels)}\\) :*",
+    ]
+    for key, duel in duels.items():
+        lines.append(
+            f"• @{esc(duel['challenger_name'])} 🆚 @{esc(duel['challenged_name'])} — _{esc(duel['status'])}_ "
+            f"`{esc(duel.get('challenger_channel'))}` / `{esc(duel.get('challenged_channel'))}`"
+        )
+    for r in ranks:
+        lines.append(f"🏆 Rank _{esc(r['status'])}_ : *{len(r['players'])}* joueurs")
+
+    for page in paginate(lines):
+        await update.message.reply_text(page)
 
 
 # ─────────────────────────────────────────────
 #  LANCEMENT
 # ─────────────────────────────────────────────
 
-class HealthHandler(BaseHTTPRequestHandler):
-    """Serveur HTTP minimal pour garder le service actif sur Render/Koyeb."""
-    def do_GET(self):
-        self.send_response(200)
-        self.end_headers()
-        self.wfile.write(b"DuelBot is running!")
-    def log_message(self, format, *args):
-        pass  # Silence les logs HTTP
+# Serveur HTTP minimal pour garder le service actif sur Render/Koyeb : tourne sur la
+# boucle asyncio du bot (pas de thread dédié), ne répond 200 qu'à GET/HEAD sur /
+def _http_response(status: str, body: bytes, extra: bytes = b"") -> tuple[bytes, bytes]:
+    """(en-têtes, corps) d'une réponse complète ; HEAD n'envoie que les en-têtes."""
+    head = (
+        b"HTTP/1.1 " + status.encode() + b"\r\n"
+        b"Content-Type: text/plain\r\n"
+        b"Content-Length: " + str(len(body)).encode() + b"\r\n" + extra +
+        b"Connection: close\r\n\r\n"
+    )
+    return head, body
 
 
-def run_health_server():
-    port = int(os.environ.get("PORT", 10000))
-    server = HTTPServer(("0.0.0.0", port), HealthHandler)
+HEALTH_RESPONSE    = _http_response("200 OK", b"DuelBot is running!")
+HEALTH_NOT_FOUND   = _http_response("404 Not Found", b"Not Found")
+HEALTH_NOT_ALLOWED = _http_response("405 Method Not Allowed", b"Method Not Allowed", b"Allow: GET, HEAD\r\n")
+
+
+async def _health_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 5)
+        parts  = request.split(b"\r\n", 1)[0].split(b" ")
+        method = parts[0]
+        target = parts[1] if len(parts) > 1 else b""
+        if method not in (b"GET", b"HEAD"):
+            head, body = HEALTH_NOT_ALLOWED
+        elif target.split(b"?", 1)[0] != b"/":
+            head, body = HEALTH_NOT_FOUND
+        else:
+            head, body = HEALTH_RESPONSE
+        writer.write(head if method == b"HEAD" else head + body)
+        await writer.drain()
+    except Exception:
+        pass  # Sonde coupée ou requête invalide : rien à faire
+    finally:
+        writer.close()
+
+
+async def start_health_server() -> asyncio.AbstractServer:
+    port   = int(os.environ.get("PORT", 10000))
+    server = await asyncio.start_server(_health_client, "0.0.0.0", port)
     logger.info(f"🌐 Health server démarré sur port {port}")
-    server.serve_forever()
+    return server
 
 
 # ─────────────────────────────────────────────
@@ -1264,18 +1893,19 @@ RANK_TIMEOUT   = 600   # 10 min pour poster après le début
 async def cmd_rank(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Créer ou rejoindre une session rank."""
     if update.effective_chat.id != MAIN_GROUP_ID:
-        await update.message.reply_text("❌ Commande réservée au groupe principal.")
+        await update.message.reply_text("❌ Commande réservée au groupe principal.", parse_mode=None)
         return
 
     user = update.effective_user
     data = load_data()
-    p    = get_player(data, user.id, user.username or user.first_name)
 
-    if not p.get("channel_id"):
+    if not data["players"].get(str(user.id), {}).get("channel_id"):
         await update.message.reply_text(
-            "❌ Tu n'as pas encore enregistré ton canal.\nUtilise /mychannel d'abord !"
+            "❌ Tu n'as pas encore enregistré ton canal.\nUtilise /mychannel d'abord !",
+            parse_mode=None
         )
         return
+    p = get_player(data, user.id, display_name(user))
 
     if "ranks" not in data:
         data["ranks"] = {}
@@ -1288,17 +1918,17 @@ async def cmd_rank(update: Update, context: ContextTypes.DEFAULT_TYPE):
             break
 
     uid = str(user.id)
-    name = user.username or user.first_name
+    name = display_name(user)
 
     if open_rank:
         rid, r = open_rank
         # Vérifier si déjà inscrit
-        if uid in [str(x["id"]) for x in r["players"]]:
-            await update.message.reply_text("⚠️ Tu es déjà inscrit dans la session rank en cours !")
+        if any(str(x["id"]) == uid for x in r["players"]):
+            await update.message.reply_text("⚠️ Tu es déjà inscrit dans la session rank en cours !", parse_mode=None)
             return
 
         if len(r["players"]) >= RANK_MAX:
-            await update.message.reply_text(f"❌ La session rank est pleine ({RANK_MAX} joueurs max) !")
+            await update.message.reply_text(f"❌ La session rank est pleine ({RANK_MAX} joueurs max) !", parse_mode=None)
             return
 
         r["players"].append({
@@ -1322,11 +1952,11 @@ async def cmd_rank(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     else:
         # Créer une nouvelle session
-        import time as _t
-        rid = f"rank_{int(_t.time())}"
+        now = time.time()
+        rid = f"rank_{int(now)}"
         data["ranks"][rid] = {
             "status":     "open",
-            "created_at": _t.time(),
+            "created_at": now,
             "created_by": user.id,
             "players": [{
                 "id":           user.id,
@@ -1364,8 +1994,7 @@ async def cmd_startrank(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Vérifier admin
     try:
-        member = await context.bot.get_chat_member(MAIN_GROUP_ID, user.id)
-        is_admin = member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]
+        is_admin = await is_group_admin(context.bot, user.id)
     except Exception:
         is_admin = False
 
@@ -1377,23 +2006,23 @@ async def cmd_startrank(update: Update, context: ContextTypes.DEFAULT_TYPE):
             break
 
     if not open_rank:
-        await update.message.reply_text("❌ Aucune session rank en attente.")
+        await update.message.reply_text("❌ Aucune session rank en attente.", parse_mode=None)
         return
 
     rid, r = open_rank
 
     # Seul le créateur ou un admin peut démarrer
     if r["created_by"] != user.id and not is_admin:
-        await update.message.reply_text("❌ Seul le créateur de la session ou un admin peut la démarrer.")
+        await update.message.reply_text("❌ Seul le créateur de la session ou un admin peut la démarrer.", parse_mode=None)
         return
 
     if len(r["players"]) < 2:
-        await update.message.reply_text("❌ Il faut au moins 2 joueurs pour démarrer !")
+        await update.message.reply_text("❌ Il faut au moins 2 joueurs pour démarrer !", parse_mode=None)
         return
 
-    import time as _t
     r["status"]     = "active"
-    r["started_at"] = _t.time()
+    r["started_at"] = time.time()
+    refresh_watched_chats(data)
     save_data(data)
 
     players_list = "\n".join([
@@ -1413,7 +2042,7 @@ async def cmd_startrank(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"🎬 GO GO GO !"
     )
     await update.message.reply_text(msg, parse_mode="HTML")
-    asyncio.create_task(rank_timeout(context.bot, rid))
+    schedule_timer(r["started_at"] + RANK_TIMEOUT, rid, "rank", r["started_at"])
 
 
 async def cmd_cancelrank(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1421,28 +2050,30 @@ async def cmd_cancelrank(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     data = load_data()
 
-    for rid, r in list(data.get("ranks", {}).items()):
-        if r["status"] in ["open", "active"]:
+    # Les boucles modifient une session puis sortent : pas de copie du dict nécessaire
+    for r in data.get("ranks", {}).values():
+        if r["status"] in ("open", "active"):
             if r["created_by"] == user.id:
                 r["status"] = "cancelled"
+                refresh_watched_chats(data)
                 save_data(data)
-                await update.message.reply_text("🚫 Session rank annulée.")
+                await update.message.reply_text("🚫 Session rank annulée.", parse_mode=None)
                 return
 
     # Vérifier si admin
     try:
-        member = await context.bot.get_chat_member(MAIN_GROUP_ID, user.id)
-        if member.status in [ChatMember.ADMINISTRATOR, ChatMember.OWNER]:
-            for rid, r in list(data.get("ranks", {}).items()):
-                if r["status"] in ["open", "active"]:
+        if await is_group_admin(context.bot, user.id):
+            for r in data.get("ranks", {}).values():
+                if r["status"] in ("open", "active"):
                     r["status"] = "cancelled"
+                    refresh_watched_chats(data)
                     save_data(data)
-                    await update.message.reply_text("🚫 Session rank annulée par un admin.")
+                    await update.message.reply_text("🚫 Session rank annulée par un admin.", parse_mode=None)
                     return
     except Exception:
         pass
 
-    await update.message.reply_text("❌ Aucune session rank à annuler.")
+    await update.message.reply_text("❌ Aucune session rank à annuler.", parse_mode=None)
 
 
 async def cmd_rankstatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1472,7 +2103,7 @@ async def cmd_rankstatus(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("\n".join(lines), parse_mode="HTML")
             return
 
-    await update.message.reply_text("ℹ️ Aucune session rank en cours.\nUtilise /rank pour en créer une !")
+    await update.message.reply_text("ℹ️ Aucune session rank en cours.\nUtilise /rank pour en créer une !", parse_mode=None)
 
 
 async def handle_rank_video(bot, chat_id: int, video_size: int, post_ts: float):
@@ -1526,6 +2157,7 @@ async def handle_rank_video(bot, chat_id: int, video_size: int, post_ts: float):
         rank_pos  = len(posted_players)
         pts_won   = RANK_POINTS.get(rank_pos, 0)
         remaining = len([p for p in r["players"] if not p["posted"]])
+        complete  = remaining == 0   # décidé avant l'await : l'état peut changer pendant l'envoi
 
         post_dt  = datetime.fromtimestamp(post_ts)
         post_str = post_dt.strftime("%d/%m/%Y à %H:%M:%S")
@@ -1548,16 +2180,21 @@ async def handle_rank_video(bot, chat_id: int, video_size: int, post_ts: float):
         except Exception as e:
             logger.error(f"Erreur notif rank position: {e}")
 
-        # Si tous ont posté → clore le rank
-        if remaining == 0:
+        # Si tous ont posté → clore le rank (close_rank ignore un rank déjà clos entre-temps)
+        if complete:
             await close_rank(bot, rid, data, reason="complete")
         return
 
 
 async def close_rank(bot, rid: str, data: dict, reason: str = "complete"):
     """Clore la session rank et distribuer les points."""
-    r = data["ranks"][rid]
+    # handle_rank_video attend l'envoi de la position avant d'appeler close_rank :
+    # le timeout ou /cancelrank a pu clore le rank entre-temps → ne rien distribuer deux fois
+    r = data["ranks"].get(rid)
+    if r is None or r["status"] != "active":
+        return
     r["status"] = "finished"
+    refresh_watched_chats(data)
 
     posted  = sorted([p for p in r["players"] if p["posted"]], key=lambda x: x["post_ts"])
     no_post = [p for p in r["players"] if not p["posted"]]
@@ -1565,12 +2202,12 @@ async def close_rank(bot, rid: str, data: dict, reason: str = "complete"):
     # Distribuer les points
     for i, p in enumerate(posted):
         pts = RANK_POINTS.get(i + 1, 0)
-        uid = str(p["id"])
-        if uid in data["players"]:
-            data["players"][uid]["points"]       += pts
-            data["players"][uid]["duels_played"]  = data["players"][uid].get("duels_played", 0) + 1
+        player = data["players"].get(str(p["id"]))
+        if player is not None:
+            player["points"]       += pts
+            player["duels_played"]  = player.get("duels_played", 0) + 1
             if pts > 0:
-                data["players"][uid]["wins"] = data["players"][uid].get("wins", 0) + 1
+                player["wins"] = player.get("wins", 0) + 1
 
     save_data(data)
 
@@ -1611,20 +2248,18 @@ async def close_rank(bot, rid: str, data: dict, reason: str = "complete"):
         logger.error(f"Erreur envoi résultats rank: {e}")
 
 
-async def rank_timeout(bot, rid: str):
+async def rank_timeout(bot, rid: str, started_at: float):
     """Timeout du rank après 10 minutes."""
-    await asyncio.sleep(RANK_TIMEOUT)
     data = load_data()
-    if rid not in data.get("ranks", {}):
-        return
-    r = data["ranks"][rid]
-    if r["status"] != "active":
+    r    = data.get("ranks", {}).get(rid)
+    if r is None or r["status"] != "active" or r.get("started_at", 0) != started_at:
         return
 
     posted = [p for p in r["players"] if p["posted"]]
     if not posted:
         # Personne n'a posté
         r["status"] = "finished"
+        refresh_watched_chats(data)
         save_data(data)
         try:
             await bot.send_message(
@@ -1639,13 +2274,17 @@ async def rank_timeout(bot, rid: str):
     await close_rank(bot, rid, data, reason="timeout")
 
 
-def main():
-    # Démarrer le serveur HTTP EN PREMIER pour passer le health check Render
-    health_thread = threading.Thread(target=run_health_server, daemon=True)
-    health_thread.start()
-    import time as _time
-    _time.sleep(1)  # Laisser le temps au serveur de démarrer
+# Échéances gérées par _timer_loop : type → coroutine(bot, clé du duel ou du rank, marque)
+_TIMER_HANDLERS = {
+    "accept":   duel_accept_timeout,
+    "video":    duel_video_timeout,
+    "reminder": scheduled_duel_reminder,
+    "start":    scheduled_duel_start,
+    "rank":     rank_timeout,
+}
+
 
+def main():
     # Vérifications au démarrage
     if not BOT_TOKEN:
         logger.critical("❌ BOT_TOKEN manquant ! Ajoute la variable d'environnement BOT_TOKEN sur Koyeb.")
@@ -1657,64 +2296,116 @@ def main():
     logger.info(f"✅ BOT_TOKEN détecté")
     logger.info(f"✅ MAIN_GROUP_ID = {MAIN_GROUP_ID}")
 
-    app = Application.builder().token(BOT_TOKEN).build()
-
-    app.add_handler(CommandHandler("start",        cmd_start))
-    app.add_handler(CommandHandler("help",         cmd_start))
-    app.add_handler(CommandHandler("join",         cmd_join))
-    app.add_handler(CommandHandler("mychannel",    cmd_mychannel))
-    app.add_handler(CommandHandler("addchannel",   cmd_addchannel))
-    app.add_handler(CommandHandler("channels",     cmd_channels))
-    app.add_handler(CommandHandler("settimezone",  cmd_settimezone))
-    app.add_handler(CommandHandler("duel",         cmd_duel))
-    app.add_handler(CommandHandler("accept",       cmd_accept))
-    app.add_handler(CommandHandler("decline",      cmd_decline))
-    app.add_handler(CommandHandler("cancel",       cmd_cancel))
-    app.add_handler(CommandHandler("top",          cmd_top))
-    app.add_handler(CommandHandler("classement",   cmd_top))
-    app.add_handler(CommandHandler("stats",        cmd_stats))
-    app.add_handler(CommandHandler("mystats",      cmd_stats))
-    app.add_handler(CommandHandler("regles",       cmd_regles))
-    app.add_handler(CommandHandler("resetpoints",  cmd_resetpoints))
-    app.add_handler(CommandHandler("debug",        cmd_debug))
-    app.add_handler(CommandHandler("chatid",       cmd_chatid))
-    app.add_handler(CommandHandler("rank",         cmd_rank))
-    app.add_handler(CommandHandler("startrank",    cmd_startrank))
-    app.add_handler(CommandHandler("cancelrank",   cmd_cancelrank))
-    app.add_handler(CommandHandler("rankstatus",   cmd_rankstatus))
+    # MarkdownV2 par défaut : les messages texte brut passent parse_mode=None, les HTML "HTML".
+    # Les handlers tournent en parallèle sans verrou : chaque modification de l'état partagé
+    # se fait sans await, et les chemins qui attendent entre deux (clôture d'un rank, timeouts)
+    # revérifient le statut avant d'agir.
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .defaults(Defaults(parse_mode=ParseMode.MARKDOWN_V2))
+        .request(HTTPXRequest(connection_pool_size=API_POOL_SIZE, pool_timeout=5.0))
+        .concurrent_updates(CONCURRENT_UPDATES)
+    )
+    # Limiteur d'envoi (30 msg/s global, 20 msg/min par groupe) : les rafales
+    # d'annonces sont lissées au lieu de finir en 429
+    if aiolimiter:
+        builder = builder.rate_limiter(AIORateLimiter(max_retries=SEND_MAX_RETRIES))
+        logger.info("✅ Limiteur d'envoi activé")
+    app = builder.build()
+
+    # Un seul CommandHandler pour toutes les commandes : PTB ne teste qu'un handler
+    # par update (au lieu d'un par commande, vidéos comprises) et l'aiguillage est un dict
+    commands = {
+        "start":       cmd_start,
+        "help":        cmd_start,
+        "join":        cmd_join,
+        "mychannel":   cmd_mychannel,
+        "addchannel":  cmd_addchannel,
+        "channels":    cmd_channels,
+        "settimezone": cmd_settimezone,
+        "duel":        cmd_duel,
+        "accept":      cmd_accept,
+        "decline":     cmd_decline,
+        "cancel":      cmd_cancel,
+        "top":         cmd_top,
+        "classement":  cmd_top,
+        "stats":       cmd_stats,
+        "mystats":     cmd_stats,
+        "regles":      cmd_regles,
+        "resetpoints": cmd_resetpoints,
+        "debug":       cmd_debug,
+        "chatid":      cmd_chatid,
+        "rank":        cmd_rank,
+        "startrank":   cmd_startrank,
+        "cancelrank":  cmd_cancelrank,
+        "rankstatus":  cmd_rankstatus,
+    }
+
+    async def dispatch_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        # Même découpage que CommandHandler : "/cmd@NomDuBot args" → "cmd"
+        msg  = update.effective_message
+        name = msg.text[1:msg.entities[0].length].split("@", 1)[0].lower()
+        await commands[name](update, context)
+
+    app.add_handler(CommandHandler(list(commands), dispatch_command))
 
     app.add_handler(CallbackQueryHandler(callback_settz, pattern=r"^settz:"))
 
-    # Handler vidéo pour messages normaux (groupes)
-    app.add_handler(MessageHandler(
-        filters.VIDEO | filters.Document.MimeType("video/mp4"),
-        handle_video
-    ))
-    # Handler vidéo spécifique pour les posts de CANAUX
-    app.add_handler(MessageHandler(
-        filters.UpdateType.CHANNEL_POSTS & (filters.VIDEO | filters.Document.MimeType("video/mp4")),
-        handle_video
-    ))
+    # Un seul handler vidéo : VIDEO_FILTER s'applique aussi bien aux messages de groupe
+    # qu'aux posts de canaux (effective_message)
+    app.add_handler(MessageHandler(VIDEO_FILTER, handle_video))
 
     logger.info("🤖 DuelBot V4 démarré !")
     logger.info(f"📢 Groupe main configuré : {MAIN_GROUP_ID}")
 
     # Vérifier que le bot peut envoyer dans le groupe main au démarrage
     async def post_start_message(app):
+        restore_timers(load_data())
+        app.bot_data["flush_task"] = asyncio.create_task(_flush_loop())
+        app.bot_data["timer_task"] = asyncio.create_task(_timer_loop(app.bot))
         try:
             await app.bot.send_message(
                 MAIN_GROUP_ID,
-                "🤖 DuelBot démarré et opérationnel ! Tapez /start pour commencer."
+                "🤖 DuelBot démarré et opérationnel ! Tapez /start pour commencer.",
+                parse_mode=None
             )
             logger.info("✅ Message de démarrage envoyé dans le groupe main")
         except Exception as e:
             logger.error(f"❌ Impossible d'envoyer dans le groupe main ({MAIN_GROUP_ID}): {e}")
             logger.error("Vérifiez que le bot est admin dans le groupe main !")
 
-    app.post_init = post_start_message
+    # Écrire les dernières modifications avant de quitter
+    async def post_shutdown(app):
+        for name in ("timer_task", "flush_task"):
+            task = app.bot_data.pop(name, None)
+            if task:
+                task.cancel()
+        server = app.bot_data.pop("health_server", None)
+        if server:
+            server.close()
+        flush_data()
+
+    app.post_init     = post_start_message
+    app.post_shutdown = post_shutdown
+
+    # uvloop (si installé) doit remplacer la boucle avant que run_polling ne la crée
+    if uvloop:
+        uvloop.install()
+        logger.info("✅ Boucle uvloop activée")
+
+    # Serveur HTTP en premier pour passer le health check Render/Koyeb : il est lancé sur la
+    # boucle que run_polling reprend, et répond donc déjà pendant la connexion à Telegram
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        app.bot_data["health_server"] = loop.run_until_complete(start_health_server())
+    except OSError as e:
+        logger.error(f"❌ Health server indisponible : {e}")
 
+    # Seuls les types réellement traités : commandes/vidéos, posts de canaux, boutons
     app.run_polling(
-        allowed_updates=["message", "channel_post", "callback_query", "edited_channel_post"]
+        allowed_updates=[Update.MESSAGE, Update.CHANNEL_POST, Update.CALLBACK_QUERY]
     )
 
 